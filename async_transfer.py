@@ -0,0 +1,355 @@
+import asyncio
+import ftplib
+import logging
+import os
+import re
+from collections import namedtuple
+from integrity import HASH_NAMES, StreamChecksum, checksum_algorithm, _hash_algorithms
+from metrics import track_phase, ACTIVE_CONNECTIONS, QUEUE_DEPTH, FILES_MOVED, BYTES_MOVED
+from transfer import (
+    is_connection_error, resume_offset, part_paths, commit_download, RECONNECT_ATTEMPTS, RECONNECT_DELAY,
+    DEFAULT_BLOCKSIZE, JOURNAL_INTERVAL, _rest_unsupported, _write_journal
+)
+
+# Alamat dan kredensial satu server FTP
+FtpEndpoint = namedtuple('FtpEndpoint', ['host', 'port', 'user', 'password', 'folder'])
+
+# Penanda akhir antrean untuk worker
+_STOP = object()
+
+_PASV_RE = re.compile(r'(\d+),(\d+),(\d+),(\d+),(\d+),(\d+)')
+
+# Klien FTP minimal di atas asyncio streams; banyak sesi bisa berjalan
+# bersamaan di satu event loop tanpa satu thread per koneksi.
+# Error balasan server memakai exception ftplib agar penanganannya sama.
+class AsyncFtpClient:
+    def __init__(self, endpoint, timeout=30):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._features = None
+
+    async def _read_response(self):
+        line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+        if not line:
+            raise EOFError("Koneksi kontrol FTP ditutup oleh server")
+        text = line.decode('utf-8', 'replace').rstrip('\r\n')
+        code = text[:3]
+        # Balasan multi-baris: "123-..." sampai baris "123 ..."
+        if text[3:4] == '-':
+            while True:
+                line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+                if not line:
+                    raise EOFError("Koneksi kontrol FTP ditutup oleh server")
+                more = line.decode('utf-8', 'replace').rstrip('\r\n')
+                text += '\n' + more
+                if more[:3] == code and more[3:4] == ' ':
+                    break
+        if code[:1] == '4':
+            raise ftplib.error_temp(text)
+        if code[:1] == '5':
+            raise ftplib.error_perm(text)
+        if code[:1] not in '123':
+            raise ftplib.error_proto(text)
+        return code, text
+
+    async def _command(self, command):
+        self._writer.write(command.encode('utf-8') + b'\r\n')
+        await self._writer.drain()
+        return await self._read_response()
+
+    async def connect(self):
+        endpoint = self.endpoint
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(endpoint.host, endpoint.port), self.timeout
+        )
+        await self._read_response()
+        code, _ = await self._command(f'USER {endpoint.user}')
+        if code == '331':
+            await self._command(f'PASS {endpoint.password}')
+        if endpoint.folder:
+            await self._command(f'CWD {endpoint.folder}')
+        await self._command('TYPE I')
+        return self
+
+    # Buka koneksi data mode pasif; alamat dari server diabaikan (aman di balik NAT)
+    async def _open_data(self):
+        _, text = await self._command('PASV')
+        match = _PASV_RE.search(text)
+        if not match:
+            raise ftplib.error_proto(text)
+        numbers = [int(n) for n in match.groups()]
+        port = (numbers[4] << 8) + numbers[5]
+        return await asyncio.wait_for(asyncio.open_connection(self.endpoint.host, port), self.timeout)
+
+    async def size(self, name):
+        try:
+            _, text = await self._command(f'SIZE {name}')
+        except ftplib.error_perm:
+            return None
+        return int(text[4:].strip())
+
+    # Daftar fitur server dari FEAT, diminta sekali per sesi (lihat integrity.server_features)
+    async def features(self):
+        if self._features is None:
+            features = {}
+            try:
+                _, text = await self._command('FEAT')
+                for line in text.splitlines()[1:-1]:
+                    name, _, params = line.strip().partition(' ')
+                    features[name.upper()] = params
+            except ftplib.error_perm:
+                pass
+            self._features = features
+        return self._features
+
+    # Apakah verifikasi di server hanya tersedia dalam bentuk CRC32
+    async def needs_crc(self, algorithm):
+        features = await self.features()
+        algorithms = _hash_algorithms(features)
+        if HASH_NAMES.get(algorithm) in algorithms:
+            return False
+        return 'CRC32' in algorithms or 'XCRC' in features
+
+    # Minta checksum file lewat HASH atau XCRC (lihat integrity.remote_checksum).
+    # Mengembalikan (algoritme, hex) atau None jika server tidak mendukung.
+    async def checksum(self, name, algorithm):
+        features = await self.features()
+        algorithms = _hash_algorithms(features)
+        try:
+            for candidate, kind in ((HASH_NAMES.get(algorithm), algorithm), ('CRC32', 'crc32')):
+                if candidate in algorithms:
+                    await self._command(f'OPTS HASH {candidate}')
+                    _, text = await self._command(f'HASH {name}')
+                    return kind, text.split()[3].lower()
+            if 'XCRC' in features:
+                _, text = await self._command(f'XCRC {name}')
+                return 'crc32', text.split()[1].lower()
+        except (ftplib.error_perm, IndexError) as e:
+            logging.warning(f"Server gagal memberi checksum untuk {name}: {e}")
+        return None
+
+    # Unduh file ke `.part`, lanjutkan dengan REST bila ada sisa unduhan
+    # sebelumnya, lalu rename ke `local_path` saat lengkap. Offset dicatat ke
+    # journal setiap JOURNAL_INTERVAL byte agar putus koneksi atau proses mati
+    # bisa dilanjutkan. `checksum` (StreamChecksum) dihitung dari data yang
+    # diterima; `limiter` membatasi laju byte (max_bytes_per_sec).
+    async def retrieve(self, name, local_path, blocksize=None, checksum=None, size=None, limiter=None):
+        loop = asyncio.get_running_loop()
+        part_path, journal_path = part_paths(local_path)
+        blocksize = blocksize or int(os.getenv('FTP_BLOCKSIZE', DEFAULT_BLOCKSIZE))
+        remote_size = size if size is not None else await self.size(name)
+        offset = resume_offset(local_path, name, remote_size)
+        received = offset
+        if offset and checksum is not None:
+            await loop.run_in_executor(None, checksum.update_from_file, part_path, offset)
+        data_reader, data_writer = await self._open_data()
+        try:
+            if offset:
+                try:
+                    await self._command(f'REST {offset}')
+                except ftplib.error_perm as e:
+                    if not _rest_unsupported(e):
+                        raise
+                    # Server tidak mendukung REST; buang .part dan ulang dari awal
+                    logging.warning(f"Server menolak REST untuk {name}. Mengunduh ulang dari awal.")
+                    open(part_path, 'wb').close()
+                    if checksum is not None:
+                        checksum.reset()
+                    offset = received = 0
+            await self._command(f'RETR {name}')
+            with open(part_path, 'ab') as part:
+                committed = received
+                try:
+                    while True:
+                        chunk = await asyncio.wait_for(data_reader.read(blocksize), self.timeout)
+                        if not chunk:
+                            break
+                        if checksum is not None:
+                            checksum.update(chunk)
+                        part.write(chunk)
+                        received += len(chunk)
+                        if received - committed >= JOURNAL_INTERVAL:
+                            await loop.run_in_executor(
+                                None, _commit_part, part, journal_path, name, remote_size, received
+                            )
+                            committed = received
+                        if limiter is not None:
+                            delay = limiter.bytes_delay(len(chunk))
+                            if delay:
+                                await asyncio.sleep(delay)
+                finally:
+                    # Catat posisi terakhir agar putus koneksi bisa dilanjutkan
+                    part.flush()
+                    _write_journal(journal_path, name, remote_size, received)
+        finally:
+            data_writer.close()
+        await self._read_response()
+        if remote_size is not None and received != remote_size:
+            raise EOFError(f"Unduhan {name} tidak lengkap ({received}/{remote_size} byte)")
+        commit_download(local_path)
+        return received
+
+    async def delete(self, name):
+        await self._command(f'DELE {name}')
+
+    async def quit(self):
+        try:
+            await self._command('QUIT')
+        except Exception:
+            pass
+        self.close()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+# Pastikan data .part sampai ke disk sebelum offset-nya dicatat di journal
+def _commit_part(part, journal_path, name, remote_size, offset):
+    part.flush()
+    os.fsync(part.fileno())
+    _write_journal(journal_path, name, remote_size, offset)
+
+# Jalankan panggilan blocking (checkpoint SQLite, dedup, status writer) di
+# thread pool bawaan agar event loop dan sesi lain tidak ikut tertahan
+def _blocking(fn, *args):
+    return asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+# Pastikan salinan lokal sama dengan file di server sebelum DELE (seperti
+# integrity.verify_download): ukuran dari SIZE, lalu HASH/XCRC jika ada di FEAT.
+# Tanpa ukuran maupun checksum dari server DELE ditolak, karena salinan tidak
+# bisa dibuktikan lengkap. Melempar ValueError jika ada yang tidak cocok.
+async def _verify(client, name, local_path, checksum, remote_size):
+    local_size = os.path.getsize(local_path)
+    if remote_size is not None and local_size != remote_size:
+        raise ValueError(f"Ukuran {name} tidak cocok: lokal {local_size}, FTP {remote_size}")
+    remote = await client.checksum(name, checksum.algorithm) if checksum is not None else None
+    if remote is None:
+        if remote_size is None:
+            raise ValueError(f"{name} tidak bisa diverifikasi (server tidak memberi SIZE maupun checksum); DELE dibatalkan")
+        return None
+    kind, value = remote
+    local = checksum.hexdigest() if kind == checksum.algorithm else f'{checksum.crc32:08x}'
+    if kind == 'crc32' and not checksum.crc:
+        crc = await _blocking(StreamChecksum(checksum.algorithm, crc=True).update_from_file, local_path)
+        local = f'{crc.crc32:08x}'
+    if int(local, 16) != int(value, 16):
+        raise ValueError(f"Checksum {kind} {name} tidak cocok: lokal {local}, FTP {value}")
+    return remote
+
+async def _connect_with_retry(endpoint, name):
+    for attempt in range(1, RECONNECT_ATTEMPTS + 1):
+        try:
+            with track_phase(name, 'connect'):
+                client = await AsyncFtpClient(endpoint).connect()
+            ACTIVE_CONNECTIONS.labels(name).inc()
+            return client
+        except Exception as e:
+            logging.warning(f"Gagal membuat sesi FTP ke {endpoint.host} (percobaan {attempt}/{RECONNECT_ATTEMPTS}): {e}")
+            if attempt < RECONNECT_ATTEMPTS:
+                await asyncio.sleep(RECONNECT_DELAY * attempt)
+    return None
+
+# Worker: unduh lalu hapus setiap item memakai satu sesi miliknya sendiri.
+# DELE hanya setelah salinan lolos _verify; `on_moved(item, checksum)` menerima
+# checksum salinan lokal (None jika CHECKSUM_ALGO=none) dan dijalankan di thread.
+async def _worker(endpoint, tasks, local_dir, name_of, path_of, on_moved, stats, limiter, checkpoint, label):
+    client = None
+    algorithm = checksum_algorithm()
+    while True:
+        item = await tasks.get()
+        if item is _STOP:
+            break
+        QUEUE_DEPTH.labels(label, 'transfer').set(tasks.qsize())
+        name = name_of(item)
+        ok = False
+        # Satu kali ulang dengan sesi baru jika sesi lama mati di tengah jalan
+        for _ in range(2):
+            if client is None:
+                client = await _connect_with_retry(endpoint, label)
+                if client is None:
+                    break
+            if limiter is not None:
+                await asyncio.to_thread(limiter.acquire)
+            try:
+                # Lewati unduhan yang sudah selesai pada run sebelumnya
+                local_path = path_of(item) if path_of is not None else os.path.join(local_dir, name)
+                state = await _blocking(checkpoint.state, name) if checkpoint is not None else {}
+                checksum = StreamChecksum(algorithm, crc=await client.needs_crc(algorithm)) if algorithm else None
+                remote_size = await client.size(name)
+                if state.get('downloaded') and os.path.exists(local_path):
+                    if checksum is not None:
+                        await _blocking(checksum.update_from_file, local_path)
+                else:
+                    with track_phase(label, 'retr'):
+                        received = await client.retrieve(
+                            name, local_path, checksum=checksum, size=remote_size, limiter=limiter
+                        )
+                    BYTES_MOVED.labels(label).inc(received)
+                    if checkpoint is not None:
+                        await _blocking(checkpoint.mark, name, 'downloaded')
+                with track_phase(label, 'verify'):
+                    await _verify(client, name, local_path, checksum, remote_size)
+                with track_phase(label, 'dele'):
+                    await client.delete(name)
+                if checkpoint is not None:
+                    await _blocking(checkpoint.mark, name, 'deleted')
+                if on_moved is not None:
+                    await _blocking(on_moved, item, checksum)
+                if checkpoint is not None:
+                    await _blocking(checkpoint.finish, name)
+                FILES_MOVED.labels(label).inc()
+                logging.debug(f"Berhasil memindahkan dan menghapus: {name}")
+                if limiter is not None:
+                    limiter.on_success()
+                ok = True
+                break
+            except Exception as e:
+                if limiter is not None:
+                    limiter.on_error(e)
+                if not is_connection_error(e):
+                    logging.error(f"Gagal memproses file {name}: {e}")
+                    break
+                logging.warning(f"Koneksi FTP ke {endpoint.host} terputus ({e}). Membuat ulang sesi...")
+                client.close()
+                ACTIVE_CONNECTIONS.labels(label).dec()
+                client = None
+        stats['ok' if ok else 'failed'] += 1
+    if client is not None:
+        await client.quit()
+        ACTIVE_CONNECTIONS.labels(label).dec()
+
+# Pindahkan item dari satu server FTP memakai `sessions` sesi di satu event loop.
+# `items` boleh berupa iterator blocking (cursor MongoDB); dibaca lewat thread
+# agar event loop tidak ikut tertahan. `path_of(item)` opsional menentukan lokasi
+# lokal (misalnya layout arsip per tanggal); bawaannya `local_dir`/nama.
+async def run_async_transfers(endpoint, items, local_dir, sessions, name_of=lambda item: item,
+                              on_moved=None, limiter=None, checkpoint=None, name=None, path_of=None):
+    label = name or endpoint.host
+    tasks = asyncio.Queue(maxsize=sessions * 2)
+    stats = {'ok': 0, 'failed': 0}
+    workers = [
+        asyncio.create_task(_worker(endpoint, tasks, local_dir, name_of, path_of, on_moved, stats, limiter, checkpoint, label))
+        for _ in range(sessions)
+    ]
+    iterator = iter(items)
+    try:
+        while True:
+            item = await asyncio.to_thread(next, iterator, _STOP)
+            if item is _STOP:
+                break
+            await tasks.put(item)
+    finally:
+        for _ in workers:
+            await tasks.put(_STOP)
+        await asyncio.gather(*workers)
+
+    logging.info(f"Transfer {endpoint.host} selesai: {stats['ok']} berhasil, {stats['failed']} gagal.")
+    return stats
+
+# Jalankan beberapa transfer (misalnya beberapa server FTP) bersamaan;
+# setiap job adalah dict argumen untuk run_async_transfers
+async def run_many(jobs):
+    return await asyncio.gather(*(run_async_transfers(**job) for job in jobs))
@@ -0,0 +1,306 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Benchmark lokal: server FTP (pyftpdlib) dan pengganti MongoDB (mongomock atau
+# mongod lokal lewat --mongo-uri) diisi file JPG sintetis, lalu setiap mode
+# dijalankan di proses anak agar RSS puncaknya terukur terpisah.
+# Butuh: pip install pyftpdlib mongomock
+
+MODES = ['main-yesterday', 'main-last-month', 'main-all', 'index', 'move_all', 'move_daily']
+
+BENCH_USER = 'bench'
+BENCH_PASS = 'bench'
+
+# Tanggal yang dipakai sebagai prefix nama file untuk setiap mode
+def file_date(mode):
+    today = datetime.now()
+    if mode == 'main-yesterday':
+        return today - timedelta(days=1)
+    if mode == 'main-last-month':
+        return today.replace(day=1) - timedelta(days=1)
+    return today
+
+# Ukuran file sintetis sesuai distribusi
+def file_sizes(count, size, distribution, seed):
+    rng = random.Random(seed)
+    if distribution == 'fixed':
+        return [size] * count
+    if distribution == 'uniform':
+        return [rng.randint(size // 2, size * 3 // 2) for _ in range(count)]
+    return [max(1, int(rng.lognormvariate(0, 0.5) * size)) for _ in range(count)]
+
+# Isi direktori FTP dengan file JPG sintetis; kembalikan daftar nama
+def seed_files(remote_dir, mode, sizes):
+    prefix = file_date(mode).strftime('%Y%m%d')
+    names = []
+    for index, size in enumerate(sizes):
+        name = f'{prefix}_{index:07d}.jpg'
+        with open(os.path.join(remote_dir, name), 'wb') as jpg:
+            jpg.write(b'\xff\xd8' + os.urandom(max(0, size - 4)) + b'\xff\xd9')
+        names.append(name)
+    return names
+
+def start_ftp_server(remote_dir):
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+    from pyftpdlib.log import config_logging
+
+    config_logging(level=logging.WARNING)
+    authorizer = DummyAuthorizer()
+    authorizer.add_user(BENCH_USER, BENCH_PASS, remote_dir, perm='elradfmwMT')
+    handler = type('BenchHandler', (FTPHandler,), {'authorizer': authorizer})
+    server = ThreadedFTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, kwargs={'handle_exit': False}, daemon=True).start()
+    return server
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+# Catat waktu mulai (RETR) dan selesai (DELE) per file tanpa mengubah alur kerja
+def install_latency_probes(modules):
+    import ftplib
+    import async_transfer
+    import pipeline
+
+    started, latencies = {}, []
+
+    def start(name):
+        started.setdefault(name, time.perf_counter())
+
+    def finish(name):
+        if name in started:
+            latencies.append(time.perf_counter() - started.pop(name))
+
+    for module in modules:
+        for attribute in ('download_file', 'download_stream'):
+            if not hasattr(module, attribute):
+                continue
+            original = getattr(module, attribute)
+
+            def probed_download(ftp, file_name, *args, _original=original, **kwargs):
+                start(file_name)
+                return _original(ftp, file_name, *args, **kwargs)
+            setattr(module, attribute, probed_download)
+
+    # DELE yang dikirim sekaligus (DeleteQueue, tahap hapus mover) lewat delete_files
+    for module in list(modules) + [pipeline]:
+        if not hasattr(module, 'delete_files'):
+            continue
+        original = module.delete_files
+
+        def probed_delete_files(ftp, names, on_deleted=None, _original=original):
+            def deleted(name):
+                finish(name)
+                if on_deleted is not None:
+                    on_deleted(name)
+            return _original(ftp, names, deleted)
+        module.delete_files = probed_delete_files
+
+    ftp_delete = ftplib.FTP.delete
+
+    def probed_delete(self, file_name):
+        result = ftp_delete(self, file_name)
+        finish(file_name)
+        return result
+    ftplib.FTP.delete = probed_delete
+
+    async_retrieve = async_transfer.AsyncFtpClient.retrieve
+    async_delete = async_transfer.AsyncFtpClient.delete
+
+    async def probed_retrieve(self, name, *args, **kwargs):
+        start(name)
+        return await async_retrieve(self, name, *args, **kwargs)
+
+    async def probed_async_delete(self, name):
+        await async_delete(self, name)
+        finish(name)
+    async_transfer.AsyncFtpClient.retrieve = probed_retrieve
+    async_transfer.AsyncFtpClient.delete = probed_async_delete
+    return latencies
+
+# Pengganti MongoDB di dalam proses; bulk_write diterjemahkan ke update_one
+# karena mongomock belum mendukung UpdateOne versi pymongo terbaru
+def use_mongomock():
+    import mongomock
+    import pymongo
+
+    client = mongomock.MongoClient()
+    bulk_write = mongomock.Collection.bulk_write
+
+    def compatible_bulk_write(self, requests, ordered=True, **kwargs):
+        try:
+            return bulk_write(self, requests, ordered=ordered, **kwargs)
+        except TypeError:
+            for request in requests:
+                self.update_one(request._filter, request._doc)
+    mongomock.Collection.bulk_write = compatible_bulk_write
+    pymongo.MongoClient = lambda *args, **kwargs: client
+
+# Hitung file yang dipindahkan: file JPG di semua layout (datar, per tanggal,
+# hardlink dedup) ditambah member segmen tar dari indeks sidecar
+def count_moved(local_dir):
+    files = size = 0
+    for directory, subdirs, names in os.walk(local_dir):
+        subdirs[:] = [name for name in subdirs if name != '.blobs']
+        for name in names:
+            path = os.path.join(directory, name)
+            if name.endswith('.jpg'):
+                files += 1
+                size += os.path.getsize(path)
+            elif name.endswith('.idx'):
+                with open(path) as index:
+                    for line in index:
+                        files += 1
+                        size += json.loads(line)['size']
+    return files, size
+
+# Proses anak: isi MongoDB, jalankan satu mode, cetak hasil sebagai JSON
+def run_child(mode, names, args):
+    if not args.mongo_uri:
+        use_mongomock()
+    from pymongo import MongoClient
+
+    collection = MongoClient(os.environ['MONGO_URI'])[os.environ['MONGO_DB']][os.environ['MONGO_COLLECTION']]
+    collection.drop()
+    if mode in ('index', 'move_all', 'move_daily'):
+        now = datetime.utcnow()
+        for start in range(0, len(names), 1000):
+            collection.insert_many([
+                {'value': name, 'createdAt': now, 'process': False} for name in names[start:start + 1000]
+            ])
+
+    import index
+    import main
+    import mover
+    latencies = install_latency_probes([index, main, mover])
+
+    started = time.perf_counter()
+    if mode == 'main-yesterday':
+        main.move_yesterday_files()
+    elif mode == 'main-last-month':
+        main.move_last_month_files()
+    elif mode == 'main-all':
+        main.move_all_files()
+    elif mode == 'index':
+        index.move_all_files_from_db()
+    else:
+        script = __import__(mode)
+        runner = mover.SiteRunner(script.SITE)
+        try:
+            runner.run()
+        finally:
+            runner.close()
+    elapsed = time.perf_counter() - started
+
+    moved, moved_bytes = count_moved(os.environ['LOCAL_DIR'])
+    print(json.dumps({
+        'mode': mode,
+        'files': moved,
+        'bytes': moved_bytes,
+        'seconds': round(elapsed, 4),
+        'files_per_sec': round(moved / elapsed, 2) if elapsed else None,
+        'mb_per_sec': round(moved_bytes / elapsed / 1e6, 3) if elapsed else None,
+        'latency_p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'latency_p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+
+# Proses induk: siapkan server FTP dan file untuk setiap mode, jalankan anak
+def run_mode(mode, args, sizes):
+    with tempfile.TemporaryDirectory() as workdir:
+        remote_dir = os.path.join(workdir, 'ftp')
+        local_dir = os.path.join(workdir, 'local')
+        os.makedirs(remote_dir)
+        os.makedirs(local_dir)
+        names = seed_files(remote_dir, mode, sizes)
+        with open(os.path.join(workdir, 'names.json'), 'w') as names_file:
+            json.dump(names, names_file)
+
+        server = start_ftp_server(remote_dir)
+        env = dict(
+            os.environ,
+            FTP_HOST='127.0.0.1', FTP_PORT=str(server.address[1]), FTP_USER=BENCH_USER, FTP_PASS=BENCH_PASS,
+            FTP_FOLDER='/', LOCAL_DIR=local_dir, FTP_WORKERS=str(args.workers),
+            MONGO_URI=args.mongo_uri or 'mongodb://localhost', MONGO_DB='benchmark', MONGO_COLLECTION='histories',
+            PYTHONPATH=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if args.backend:
+            env['TRANSFER_BACKEND'] = args.backend
+        try:
+            # cwd = workdir agar log, spool, dan checkpoint benchmark tidak bercampur
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', mode, '--names', os.path.join(workdir, 'names.json')]
+                + (['--mongo-uri', args.mongo_uri] if args.mongo_uri else []),
+                cwd=workdir, env=env, capture_output=True, text=True, timeout=args.timeout
+            )
+        finally:
+            server.close_all()
+        if result.returncode != 0:
+            return {'mode': mode, 'error': result.stderr.strip().splitlines()[-1:]}
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark housekeeping FTP dengan server FTP dan MongoDB lokal")
+    parser.add_argument('--count', type=int, default=500, help="Jumlah file JPG sintetis")
+    parser.add_argument('--size', type=int, default=200_000, help="Ukuran rata-rata file (byte)")
+    parser.add_argument('--size-dist', choices=['fixed', 'uniform', 'lognormal'], default='lognormal')
+    parser.add_argument('--modes', default=','.join(MODES), help="Mode dipisah koma: " + ','.join(MODES))
+    parser.add_argument('--workers', type=int, default=4, help="FTP_WORKERS untuk mode paralel")
+    parser.add_argument('--backend', choices=['pipeline', 'thread', 'asyncio'], help="TRANSFER_BACKEND")
+    parser.add_argument('--mongo-uri', help="Pakai mongod lokal, bukan mongomock")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--timeout', type=int, default=3600, help="Batas waktu per mode (detik)")
+    parser.add_argument('--output', default='bench_results.json', help="File hasil (JSON)")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--names', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with open(args.names) as names_file:
+            run_child(args.child, json.load(names_file), args)
+        return
+
+    sizes = file_sizes(args.count, args.size, args.size_dist, args.seed)
+    results = []
+    for mode in args.modes.split(','):
+        result = run_mode(mode, args, sizes)
+        results.append(result)
+        if 'error' in result:
+            print(f"{mode:16} GAGAL: {result['error']}")
+        else:
+            print(
+                f"{mode:16} {result['files']:7d} file {result['files_per_sec']:9.2f} file/s "
+                f"{result['mb_per_sec']:8.2f} MB/s p50 {result['latency_p50_ms']} ms "
+                f"p99 {result['latency_p99_ms']} ms RSS {result['peak_rss_mb']} MB"
+            )
+
+    report = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'params': {
+            'count': args.count, 'size': args.size, 'size_dist': args.size_dist,
+            'workers': args.workers, 'backend': args.backend, 'mongo': 'mongod' if args.mongo_uri else 'mongomock',
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print(f"Hasil disimpan ke {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import logging
+import sqlite3
+import threading
+import time
+
+# Tahapan per file, disimpan sebagai kolom di tabel checkpoint
+STAGES = ('downloaded', 'deleted')
+
+# Journal checkpoint lokal (SQLite mode WAL) yang mencatat tahapan setiap file.
+# Baris dihapus setelah file selesai seluruhnya, jadi isinya hanya pekerjaan
+# yang terputus dan tetap kecil berapapun jumlah file yang sudah dipindahkan.
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'name TEXT PRIMARY KEY, downloaded INTEGER DEFAULT 0, deleted INTEGER DEFAULT 0, updated_at REAL)'
+        )
+        pending = self._conn.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+        if pending:
+            logging.info(f"Checkpoint {path}: {pending} file dari run sebelumnya belum selesai.")
+
+    # Tahapan yang sudah selesai untuk satu file, misalnya {'downloaded': True}
+    def state(self, name):
+        with self._lock:
+            row = self._conn.execute('SELECT downloaded, deleted FROM files WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return {}
+        return {stage: bool(done) for stage, done in zip(STAGES, row)}
+
+    # Catat bahwa satu tahapan sudah selesai
+    def mark(self, name, stage):
+        if stage not in STAGES:
+            raise ValueError(f"Tahapan tidak dikenal: {stage}")
+        with self._lock:
+            self._conn.execute(
+                f'INSERT INTO files (name, {stage}, updated_at) VALUES (?, 1, ?) '
+                f'ON CONFLICT(name) DO UPDATE SET {stage} = 1, updated_at = excluded.updated_at',
+                (name, time.time())
+            )
+
+    # File selesai seluruhnya; hapus dari checkpoint
+    def finish(self, name):
+        with self._lock:
+            self._conn.execute('DELETE FROM files WHERE name = ?', (name,))
+
+    # Saring item: item yang file-nya sudah dihapus dari FTP pada run sebelumnya
+    # cukup diselesaikan lewat `on_finished` (misalnya update status MongoDB)
+    def pending(self, items, key=lambda item: item, on_finished=None):
+        resumed = 0
+        for item in items:
+            name = key(item)
+            if self.state(name).get('deleted'):
+                if on_finished is not None:
+                    on_finished(item)
+                self.finish(name)
+                resumed += 1
+                continue
+            yield item
+        if resumed:
+            logging.info(f"Menyelesaikan {resumed} file yang sudah dipindahkan pada run sebelumnya.")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,149 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pymongo import MongoClient
+from dotenv import load_dotenv
+from log_setup import setup_logging
+from mover import site_from_dict, SiteRunner, SiteLog, connect_ftp
+from transfer import FtpPool
+from mongo_utils import InsertWatcher
+from scheduler import Scheduler
+from metrics import start_metrics_server
+
+# Muat variabel lingkungan dari file .env
+load_dotenv()
+
+# Lokasi file konfigurasi situs
+SITES_CONFIG = os.getenv('SITES_CONFIG', 'sites.json')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))  # Port endpoint /metrics lokal, 0 = nonaktif
+WATCH_NEW_DOCUMENTS = os.getenv('WATCH_NEW_DOCUMENTS', '1') == '1'  # Picu run situs incremental dari change stream
+TRIGGER_DEBOUNCE = float(os.getenv('TRIGGER_DEBOUNCE', 10))  # Jeda minimal (detik) antar run yang dipicu dokumen baru
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', 60))  # Ping MongoDB/NOOP FTP di antara run, 0 = nonaktif
+
+# Konfigurasi logging (teks atau JSON lines, ditulis dari thread terpisah)
+setup_logging()
+
+# Baca file konfigurasi: {"schedule": "00:00", "sites": [...]}
+def load_config(path):
+    with open(path) as config_file:
+        config = json.load(config_file)
+    sites = [site_from_dict(site) for site in config['sites']]
+    names = [site.name for site in sites]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Nama situs harus unik: {names}")
+    return config.get('schedule', '00:00'), sites
+
+# Buat runner untuk semua situs dalam satu proses. MongoClient dipakai bersama
+# per URI dan pool FTP dipakai bersama per server FTP; ukuran pool bersama adalah
+# jumlah worker semua situs di server itu, sehingga situs-situs tersebut tetap bisa
+# berjalan bersamaan dengan anggaran worker masing-masing.
+# `warm=True` membiarkan MongoClient dan sesi FTP tetap terbuka di antara run.
+def build_runners(sites, warm=False):
+    clients = {}
+    pools = {}
+    runners = []
+    for site in sites:
+        if site.mongo_uri not in clients:
+            clients[site.mongo_uri] = MongoClient(site.mongo_uri)
+        key = (site.ftp.host, site.ftp.port, site.ftp.user, site.ftp.folder)
+        if key not in pools:
+            budget = sum(s.workers for s in sites if (s.ftp.host, s.ftp.port, s.ftp.user, s.ftp.folder) == key)
+            pools[key] = FtpPool(
+                partial(connect_ftp, site.ftp, SiteLog(logging.getLogger(), {'site': site.name})), budget, site.name,
+                site.idle_check
+            )
+        runners.append(SiteRunner(site, clients[site.mongo_uri], pools[key], warm))
+    return runners, list(clients.values())
+
+# Jalankan semua situs bersamaan, masing-masing dengan anggaran worker sendiri
+def run_sites(runners, mode=None):
+    with ThreadPoolExecutor(max_workers=len(runners)) as executor:
+        futures = {runner.site.name: executor.submit(runner.run, None, mode) for runner in runners}
+        for name, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"[{name}] Gagal menjalankan situs: {e}")
+
+def run_site(runner, mode=None):
+    try:
+        runner.run(None, mode)
+    except Exception as e:
+        runner.log.error(f"Gagal menjalankan situs: {e}")
+
+# Daftarkan job satu situs ke scheduler bersama: `run_cron` situs, interval
+# `run_interval` menit untuk mode incremental, atau setiap hari pukul
+# `schedule_time` (HH:MM). Mengembalikan nama job pemindahan situs.
+def add_site_jobs(scheduler, runner, schedule_time, mode=None):
+    site = runner.site
+    name = f'{site.name}/move'
+    job = partial(run_site, runner, mode)
+    if site.run_cron:
+        scheduler.add_job(name, job, cron=site.run_cron, debounce=TRIGGER_DEBOUNCE)
+    elif (mode or site.mode) == 'incremental':
+        scheduler.add_job(name, job, interval=site.run_interval * 60, debounce=TRIGGER_DEBOUNCE)
+    else:
+        hour, minute = schedule_time.split(':')
+        scheduler.add_job(name, job, cron=f'{int(minute)} {int(hour)} * * *')
+    if HEALTH_CHECK_INTERVAL > 0:
+        scheduler.add_job(
+            f'{site.name}/health', partial(runner.health_check, HEALTH_CHECK_INTERVAL), interval=HEALTH_CHECK_INTERVAL
+        )
+    return name
+
+def main():
+    parser = argparse.ArgumentParser(description="Daemon housekeeping FTP untuk banyak situs")
+    parser.add_argument('--config', default=SITES_CONFIG, help="File konfigurasi situs (JSON)")
+    parser.add_argument('--once', action='store_true', help="Jalankan sekali lalu keluar")
+    parser.add_argument('--site', action='append', help="Hanya jalankan situs ini (boleh diulang)")
+    parser.add_argument('--mode', choices=['daily', 'all', 'incremental'], help="Ganti mode semua situs untuk run ini")
+    args = parser.parse_args()
+
+    schedule_time, sites = load_config(args.config)
+    if args.site:
+        sites = [site for site in sites if site.name in args.site]
+    if not sites:
+        logging.error("Tidak ada situs untuk dijalankan.")
+        sys.exit(1)
+    runners, clients = build_runners(sites, warm=not args.once)
+    logging.info(f"Memuat {len(runners)} situs: {', '.join(site.name for site in sites)}")
+
+    watchers = []
+    executor = None
+    try:
+        if args.once:
+            run_sites(runners, args.mode)
+            return
+        start_metrics_server(METRICS_PORT)
+        # Satu scheduler untuk semua situs; job yang jatuh tempo diserahkan ke
+        # executor sehingga situs tetap berjalan bersamaan (run dan health check)
+        executor = ThreadPoolExecutor(max_workers=len(runners) * 2, thread_name_prefix='site')
+        scheduler = Scheduler(executor)
+        for runner in runners:
+            name = add_site_jobs(scheduler, runner, schedule_time, args.mode)
+            if WATCH_NEW_DOCUMENTS and (args.mode or runner.site.mode) == 'incremental':
+                watcher = InsertWatcher(runner.collection, partial(scheduler.trigger, name))
+                watcher.start()
+                watchers.append(watcher)
+        logging.info("Menjalankan scheduler semua situs...")
+        scheduler.run_forever()
+    finally:
+        # Run yang sedang berjalan diselesaikan dulu sebelum koneksi ditutup
+        for watcher in watchers:
+            watcher.stop()
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        for runner in runners:
+            runner.close()
+        for client in clients:
+            client.close()
+
+if __name__ == "__main__":
+    # SIGTERM (pm2 stop/restart) diubah menjadi SystemExit agar flush terakhir tetap jalan
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    main()
@@ -0,0 +1,112 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Penyimpanan berbasis isi: setiap isi file disimpan sekali sebagai blob
+# (LOCAL_DIR/.blobs/<algoritme>/<2 huruf>/<checksum>), nama file di LOCAL_DIR
+# menjadi hardlink ke blob tersebut. Indeks SQLite (mode WAL) mencatat blob dan
+# semua pasangan nama -> checksum, termasuk nama sama dengan isi berbeda.
+# `link=False` tidak membuat hardlink; lokasi isi dicari lewat `lookup`.
+class DedupStore:
+    def __init__(self, root, index_path, link=True):
+        self.root = root
+        self.blob_dir = os.path.join(root, '.blobs')
+        self.link = link
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(index_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS blobs ('
+            'algorithm TEXT, digest TEXT, size INTEGER, path TEXT, created_at REAL, '
+            'PRIMARY KEY (algorithm, digest))'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS names ('
+            'name TEXT, algorithm TEXT, digest TEXT, created_at REAL, '
+            'PRIMARY KEY (name, algorithm, digest))'
+        )
+
+    def blob_path(self, algorithm, digest):
+        return os.path.join(self.blob_dir, algorithm, digest[:2], digest)
+
+    # Lokasi blob untuk checksum ini, atau None jika belum ada (atau ukurannya beda)
+    def find(self, algorithm, digest, size=None):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, path FROM blobs WHERE algorithm = ? AND digest = ?', (algorithm, digest)
+            ).fetchone()
+        if row is None or not os.path.exists(row[1]):
+            return None
+        if size is not None and row[0] != size:
+            return None
+        return row[1]
+
+    # (algoritme, checksum, ukuran, path) blob terbaru untuk sebuah nama file, atau None
+    def latest(self, name):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT n.algorithm, n.digest, b.size, b.path FROM names n '
+                'JOIN blobs b ON b.algorithm = n.algorithm AND b.digest = n.digest '
+                'WHERE n.name = ? ORDER BY n.created_at DESC LIMIT 1', (name,)
+            ).fetchone()
+        return row
+
+    # Blob terbaru untuk sebuah nama file
+    def lookup(self, name):
+        row = self.latest(name)
+        return row[3] if row else None
+
+    # Masukkan file yang baru diunduh ke store. Jika isinya sudah ada, salinan
+    # baru dibuang dan nama diarahkan ke blob lama. True jika isinya duplikat.
+    def add(self, name, local_path, checksum):
+        algorithm, digest = checksum.algorithm, checksum.hexdigest()
+        size = os.path.getsize(local_path)
+        blob = self.find(algorithm, digest, size)
+        duplicate = blob is not None
+        if duplicate:
+            os.remove(local_path)
+        else:
+            blob = self.blob_path(algorithm, digest)
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(local_path, blob)
+            with self._lock:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO blobs (algorithm, digest, size, path, created_at) VALUES (?, ?, ?, ?, ?)',
+                    (algorithm, digest, size, blob, time.time())
+                )
+        self.link_name(name, local_path, algorithm, digest, blob)
+        return duplicate
+
+    # Catat nama -> blob dan buat hardlink di `local_path`
+    def link_name(self, name, local_path, algorithm, digest, blob):
+        with self._lock:
+            previous = self._conn.execute(
+                'SELECT digest FROM names WHERE name = ? AND algorithm = ? AND digest != ?', (name, algorithm, digest)
+            ).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO names (name, algorithm, digest, created_at) VALUES (?, ?, ?, ?)',
+                (name, algorithm, digest, time.time())
+            )
+        if previous:
+            logging.warning(f"Nama {name} sudah pernah dipakai isi lain; isi lama tetap tersimpan di blob {previous[0]}.")
+        if self.link:
+            # Ganti secara atomik agar nama tidak pernah hilang sesaat
+            temp_path = local_path + '.link'
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            os.link(blob, temp_path)
+            os.replace(temp_path, local_path)
+
+    # Buat salinan kerja (hardlink) dari blob di `local_path`, misalnya agar
+    # tahap verifikasi bisa berjalan tanpa mengunduh ulang isi yang sudah ada
+    def materialize(self, blob, local_path):
+        if os.path.exists(local_path):
+            os.remove(local_path)
+        os.link(blob, local_path)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
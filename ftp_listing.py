@@ -0,0 +1,177 @@
+import bisect
+import ftplib
+import heapq
+import json
+import logging
+import os
+import tempfile
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# Jumlah entri yang diurutkan di memori sebelum ditulis ke file sementara (sorted_listing)
+SORT_CHUNK = int(os.getenv('LISTING_SORT_CHUNK', 500000))
+
+# Satu entri listing FTP; day = prefix 'YYYYMMDD' dari nama file (None jika tidak valid)
+ListingEntry = namedtuple('ListingEntry', ['name', 'size', 'mtime', 'day'])
+
+# Ambil prefix tanggal 'YYYYMMDD' dari nama file seperti 20250101_xxx.jpg
+def parse_day(name):
+    prefix = name.split('_')[0]
+    try:
+        datetime.strptime(prefix, '%Y%m%d')
+    except ValueError:
+        return None
+    return prefix
+
+# Snapshot direktori FTP yang diurutkan berdasarkan tanggal sehingga pemilihan
+# per hari/bulan/rentang cukup memakai bisect, bukan memindai semua nama
+class FtpSnapshot:
+    def __init__(self, entries):
+        dated = sorted((e for e in entries if e.day is not None), key=lambda e: (e.day, e.name))
+        self.undated = [e for e in entries if e.day is None]
+        self.dated = dated
+        self._days = [e.day for e in dated]
+        self._by_name = {e.name: e for e in entries}
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def get(self, name):
+        return self._by_name.get(name)
+
+    # Entri dengan tanggal di rentang [start, end), start/end berupa date/datetime
+    def between(self, start, end):
+        lo = bisect.bisect_left(self._days, start.strftime('%Y%m%d'))
+        hi = bisect.bisect_left(self._days, end.strftime('%Y%m%d'))
+        return self.dated[lo:hi]
+
+    # Entri dari satu hari tertentu
+    def on(self, day):
+        return self.between(day, day + timedelta(days=1))
+
+    # Entri dari satu bulan tertentu
+    def month(self, year, month):
+        start = datetime(year, month, 1)
+        end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+        return self.between(start, end)
+
+    # Semua entri, termasuk yang namanya tidak berawalan tanggal
+    def all(self):
+        return self.dated + self.undated
+
+    # Lewati item yang namanya sudah tidak ada di FTP (hemat satu RETR gagal per item).
+    # `on_skipped(item)` opsional dipanggil untuk setiap item yang dilewati.
+    def existing(self, items, key=lambda item: item, on_skipped=None):
+        skipped = 0
+        for item in items:
+            if key(item) in self._by_name:
+                yield item
+            else:
+                skipped += 1
+                if on_skipped is not None:
+                    on_skipped(item)
+        if skipped:
+            logging.info(f"Melewati {skipped} file yang tidak ada di snapshot FTP.")
+
+# Ambil snapshot direktori kerja FTP dengan satu perintah MLSD (fallback ke NLST)
+def take_snapshot(ftp, suffix='.jpg'):
+    entries = []
+    try:
+        for name, facts in ftp.mlsd(facts=['type', 'size', 'modify']):
+            if facts.get('type', 'file') != 'file' or not name.lower().endswith(suffix):
+                continue
+            size = int(facts['size']) if 'size' in facts else None
+            entries.append(ListingEntry(name, size, facts.get('modify'), parse_day(name)))
+    except ftplib.error_perm as e:
+        # Server tidak mendukung MLSD; pakai NLST tanpa ukuran dan waktu
+        logging.warning(f"MLSD tidak didukung ({e}). Memakai NLST.")
+        entries = [
+            ListingEntry(name, None, None, parse_day(name))
+            for name in ftp.nlst() if name.lower().endswith(suffix)
+        ]
+    logging.info(f"Snapshot FTP berisi {len(entries)} file.")
+    return FtpSnapshot(entries)
+
+# Ambil snapshot memakai satu sesi dari pool transfer
+def snapshot_from_pool(pool, suffix='.jpg'):
+    ftp = pool.acquire()
+    try:
+        snapshot = take_snapshot(ftp, suffix)
+    except Exception:
+        pool.discard(ftp)
+        raise
+    pool.release(ftp)
+    return snapshot
+
+# Alirkan listing direktori kerja FTP baris per baris lewat koneksi data MLSD
+# (fallback ke NLST), tanpa menampung seluruh listing seperti ftp.mlsd()
+def iter_listing(ftp, suffix='.jpg'):
+    try:
+        ftp.sendcmd('OPTS MLST type;size;modify;')
+    except ftplib.error_perm:
+        pass
+    ftp.sendcmd('TYPE A')
+    try:
+        conn = ftp.transfercmd('MLSD')
+        mlsd = True
+    except ftplib.error_perm as e:
+        logging.warning(f"MLSD tidak didukung ({e}). Memakai NLST.")
+        conn = ftp.transfercmd('NLST')
+        mlsd = False
+    with conn, conn.makefile('r', encoding=ftp.encoding) as source:
+        for line in source:
+            line = line.rstrip('\r\n')
+            if not mlsd:
+                if line.lower().endswith(suffix):
+                    yield ListingEntry(line, None, None, parse_day(line))
+                continue
+            found, _, name = line.partition(' ')
+            facts = {}
+            for fact in found[:-1].split(';'):
+                key, _, value = fact.partition('=')
+                facts[key.lower()] = value
+            if facts.get('type', 'file') != 'file' or not name.lower().endswith(suffix):
+                continue
+            size = int(facts['size']) if 'size' in facts else None
+            yield ListingEntry(name, size, facts.get('modify'), parse_day(name))
+    ftp.voidresp()
+
+def _spill(entries):
+    chunk = tempfile.TemporaryFile('w+')
+    for entry in entries:
+        chunk.write(json.dumps([entry.name, entry.size, entry.mtime]) + '\n')
+    chunk.seek(0)
+    return chunk
+
+def _read_chunk(chunk):
+    for line in chunk:
+        name, size, mtime = json.loads(line)
+        yield ListingEntry(name, size, mtime, parse_day(name))
+
+# Urutkan entri listing berdasarkan nama dengan memori terbatas: potongan
+# `chunk_size` entri diurutkan lalu ditulis ke file sementara, kemudian semua
+# potongan digabung dengan heapq.merge (external merge sort)
+def sorted_listing(entries, chunk_size=SORT_CHUNK):
+    chunks, buffer = [], []
+    try:
+        for entry in entries:
+            buffer.append(entry)
+            if len(buffer) >= chunk_size:
+                buffer.sort(key=lambda e: e.name)
+                chunks.append(_spill(buffer))
+                buffer = []
+        buffer.sort(key=lambda e: e.name)
+        if not chunks:
+            yield from buffer
+            return
+        if buffer:
+            chunks.append(_spill(buffer))
+            buffer = []
+        logging.info(f"Listing FTP diurutkan dalam {len(chunks)} potongan.")
+        yield from heapq.merge(*(_read_chunk(chunk) for chunk in chunks), key=lambda e: e.name)
+    finally:
+        for chunk in chunks:
+            chunk.close()
@@ -4,6 +4,15 @@ import logging
 from datetime import datetime
 from pymongo import MongoClient
 from dotenv import load_dotenv
+from log_setup import setup_logging
+from transfer import FtpPool, download_file
+from pipeline import DeleteQueue
+from integrity import new_checksum, verify_download
+from checkpoint import Checkpoint
+from layout import ArchiveLayout
+from mongo_utils import iter_history
+from ftp_listing import take_snapshot
+from planner import ALL_SELECTIONS, Plan
 
 # Muat variabel lingkungan dari file .env
 load_dotenv()
@@ -15,21 +24,17 @@ FTP_PASS = os.getenv('FTP_PASS')
 FTP_PORT = int(os.getenv('FTP_PORT'))
 FTP_FOLDER = os.getenv('FTP_FOLDER')
 LOCAL_DIR = os.getenv('LOCAL_DIR')
+CHECKPOINT_FILE = os.getenv('CHECKPOINT_FILE', 'checkpoint.db')  # Journal tahapan per file untuk melanjutkan run yang terputus
+LOCAL_LAYOUT = os.getenv('LOCAL_LAYOUT', 'flat')  # 'flat' atau 'date' (LOCAL_DIR/YYYY/MM/DD)
+ARCHIVE_INDEX_FILE = os.getenv('ARCHIVE_INDEX_FILE', 'archive_index.db')  # Indeks nama file -> lokasi lokal
 
 # Konfigurasi MongoDB
 MONGO_URI = os.getenv('MONGO_URI')
 MONGO_DB = os.getenv('MONGO_DB')
 MONGO_COLLECTION = os.getenv('MONGO_COLLECTION')
 
-# Konfigurasi logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('ftp_housekeeping.log'),  # Log ke file
-        logging.StreamHandler()  # Log ke konsol
-    ]
-)
+# Konfigurasi logging (teks atau JSON lines, ditulis dari thread terpisah)
+setup_logging()
 
 # Fungsi untuk menghubungkan ke FTP
 def connect_ftp():
@@ -57,20 +62,50 @@ def connect_mongodb():
         raise
 
 # Fungsi untuk memindahkan file JPG dari FTP ke lokal dan menghapusnya dari FTP
-def move_and_delete_jpg_files(ftp, local_dir, file_names):
+# `checkpoint` opsional mencatat tahapan agar run yang terputus bisa dilanjutkan
+# `snapshot` opsional memberi ukuran file dari MLSD untuk verifikasi sebelum DELE
+# DELE dikirim per batch lewat sesi kontrol kedua agar unduhan tidak menunggu
+def move_and_delete_jpg_files(ftp, local_dir, file_names, checkpoint=None, snapshot=None):
+    archive = ArchiveLayout(local_dir, LOCAL_LAYOUT, ARCHIVE_INDEX_FILE)
+    delete_pool = FtpPool(connect_ftp, 1)
+
+    # Dipanggil setelah server membalas DELE
+    def deleted(file_name, ok):
+        if not ok:
+            return
+        archive.record(file_name, archive.path_for(file_name))
+        if checkpoint:
+            checkpoint.finish(file_name)
+        logging.info(f"Berhasil memindahkan dan menghapus: {file_name}")
+
+    deletes = DeleteQueue(delete_pool, deleted)
     try:
         for file_name in file_names:
             if file_name.lower().endswith('.jpg'):
                 try:
-                    local_path = os.path.join(local_dir, file_name)
-                    with open(local_path, 'wb') as local_file:
-                        ftp.retrbinary(f'RETR {file_name}', local_file.write)
-                    ftp.delete(file_name)
-                    logging.info(f"Berhasil memindahkan dan menghapus: {file_name}")
+                    local_path = archive.path_for(file_name)
+                    state = checkpoint.state(file_name) if checkpoint else {}
+                    entry = snapshot.get(file_name) if snapshot else None
+                    size = entry.size if entry else None
+                    checksum = new_checksum(ftp)
+                    if state.get('downloaded') and os.path.exists(local_path):
+                        if checksum is not None:
+                            checksum.update_from_file(local_path)
+                    else:
+                        download_file(ftp, file_name, local_path, size=size, checksum=checksum)
+                        if checkpoint:
+                            checkpoint.mark(file_name, 'downloaded')
+                    # Hapus dari FTP hanya jika ukuran dan checksum cocok
+                    verify_download(ftp, file_name, local_path, checksum, size)
+                    deletes.submit(file_name)
                 except Exception as e:
                     logging.error(f"Gagal memproses file {file_name}: {e}")
     except Exception as e:
         logging.error(f"Gagal memindahkan file: {e}")
+    finally:
+        deletes.close()
+        delete_pool.close()
+        archive.close()
 
 # Fungsi untuk memindahkan semua file JPG berdasarkan data dari MongoDB
 def move_all_files_from_db():
@@ -80,30 +115,58 @@ def move_all_files_from_db():
         # Hubungkan ke MongoDB
         collection = connect_mongodb()
         
-        # Ambil semua data dari koleksi histories
-        records = collection.find({})
-        file_names = [record['value'] for record in records if 'value' in record]
+        # Alirkan data dari koleksi histories tanpa memuat semuanya ke memori
+        file_names = (record['value'] for record in iter_history(collection) if 'value' in record)
         
         # Hubungkan ke FTP
         ftp = connect_ftp()
+
+        # Lewati nama yang sudah tidak ada di FTP berdasarkan satu snapshot MLSD
+        checkpoint = Checkpoint(CHECKPOINT_FILE)
+        snapshot = take_snapshot(ftp)
+        file_names = snapshot.existing(checkpoint.pending(file_names))
         
         # Pindahkan dan hapus file
-        move_and_delete_jpg_files(ftp, LOCAL_DIR, file_names)
+        move_and_delete_jpg_files(ftp, LOCAL_DIR, file_names, checkpoint, snapshot)
+        checkpoint.close()
         
         # Tutup koneksi FTP
         ftp.quit()
     except Exception as e:
         logging.error(f"Gagal menjalankan move_all_files_from_db: {e}")
 
+# Fungsi untuk memindahkan file JPG persis sesuai rencana dari `python planner.py db`,
+# tanpa query MongoDB dan snapshot MLSD baru
+def move_planned_files(path):
+    try:
+        plan = Plan(path).require('db', ALL_SELECTIONS)
+        logging.info(f"Memindahkan {plan.files} file sesuai rencana {plan.path} (dibuat {plan.age()} yang lalu)...")
+        file_names = (item['name'] for item in plan)
+
+        # Hubungkan ke FTP
+        ftp = connect_ftp()
+
+        checkpoint = Checkpoint(CHECKPOINT_FILE)
+        move_and_delete_jpg_files(ftp, LOCAL_DIR, checkpoint.pending(file_names), checkpoint, plan.snapshot())
+        checkpoint.close()
+
+        # Tutup koneksi FTP
+        ftp.quit()
+    except Exception as e:
+        logging.error(f"Gagal menjalankan move_planned_files: {e}")
+
 # Fungsi utama untuk menjalankan script
 def main():
     try:
         print("Pilih fungsi yang ingin dijalankan:")
         print("1. Pindahkan semua file JPG berdasarkan data dari MongoDB")
-        choice = input("Masukkan pilihan (1): ")
+        print("2. Jalankan rencana dari file (python planner.py db)")
+        choice = input("Masukkan pilihan (1/2): ")
 
         if choice == '1':
             move_all_files_from_db()
+        elif choice == '2':
+            move_planned_files(input("File rencana: "))
         else:
             logging.warning("Pilihan tidak valid")
     except Exception as e:
@@ -0,0 +1,156 @@
+import ftplib
+import hashlib
+import logging
+import os
+import zlib
+
+# xxhash opsional; jika tidak terpasang, algoritme xxh* jatuh ke sha256
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+DEFAULT_ALGORITHM = 'sha256'
+
+# Nama algoritme pada perintah HASH (draft-bryan-ftp-hash)
+HASH_NAMES = {'sha256': 'SHA-256', 'sha1': 'SHA-1', 'sha512': 'SHA-512', 'md5': 'MD5'}
+
+# Algoritme checksum dari .env (CHECKSUM_ALGO), misalnya sha256 atau xxh3_64;
+# 'none' mematikan checksum (hanya ukuran yang dicek)
+def checksum_algorithm():
+    algorithm = os.getenv('CHECKSUM_ALGO', DEFAULT_ALGORITHM).lower()
+    if algorithm == 'none':
+        return None
+    if algorithm.startswith('xxh') and xxhash is None:
+        logging.warning(f"xxhash tidak terpasang, memakai {DEFAULT_ALGORITHM} sebagai pengganti {algorithm}.")
+        return DEFAULT_ALGORITHM
+    return algorithm
+
+def _new_hash(algorithm):
+    if algorithm.startswith('xxh'):
+        return getattr(xxhash, algorithm)()
+    return hashlib.new(algorithm)
+
+# Checksum yang dihitung sambil data diterima, tanpa membaca ulang file.
+# CRC32 ikut dihitung hanya jika server hanya bisa memberi XCRC/CRC32.
+class StreamChecksum:
+    def __init__(self, algorithm=None, crc=False):
+        self.algorithm = algorithm or checksum_algorithm()
+        self.crc = crc
+        self.reset()
+
+    def reset(self):
+        self._hash = _new_hash(self.algorithm)
+        self.crc32 = 0
+        self.size = 0
+
+    def update(self, data):
+        self._hash.update(data)
+        if self.crc:
+            self.crc32 = zlib.crc32(data, self.crc32)
+        self.size += len(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    # Tambahkan isi file yang sudah ada (misalnya bagian .part yang dilanjutkan)
+    def update_from_file(self, path, limit=None, blocksize=1024 * 1024):
+        remaining = os.path.getsize(path) if limit is None else limit
+        with open(path, 'rb') as source:
+            while remaining > 0:
+                data = source.read(min(blocksize, remaining))
+                if not data:
+                    break
+                self.update(data)
+                remaining -= len(data)
+        return self
+
+# Checksum yang sudah diketahui (misalnya dari indeks dedup) tanpa membaca data
+class KnownChecksum:
+    crc = False
+    crc32 = 0
+
+    def __init__(self, algorithm, digest, size):
+        self.algorithm = algorithm
+        self.digest = digest
+        self.size = size
+
+    def hexdigest(self):
+        return self.digest
+
+# Checksum baru untuk satu unduhan pada sesi `ftp`, atau None jika dimatikan
+def new_checksum(ftp):
+    algorithm = checksum_algorithm()
+    if algorithm is None:
+        return None
+    return StreamChecksum(algorithm, crc=needs_crc(ftp, algorithm))
+
+# Daftar fitur server dari FEAT, disimpan di objek sesi agar hanya diminta sekali
+def server_features(ftp):
+    features = getattr(ftp, '_features', None)
+    if features is None:
+        features = {}
+        try:
+            for line in ftp.sendcmd('FEAT').splitlines()[1:-1]:
+                name, _, params = line.strip().partition(' ')
+                features[name.upper()] = params
+        except ftplib.error_perm:
+            pass
+        ftp._features = features
+    return features
+
+def _hash_algorithms(features):
+    return [name.rstrip('*').upper() for name in features.get('HASH', '').split(';') if name]
+
+# Apakah verifikasi di server hanya tersedia dalam bentuk CRC32
+def needs_crc(ftp, algorithm):
+    features = server_features(ftp)
+    algorithms = _hash_algorithms(features)
+    if HASH_NAMES.get(algorithm) in algorithms:
+        return False
+    return 'CRC32' in algorithms or 'XCRC' in features
+
+# Minta checksum file dari server lewat HASH atau XCRC.
+# Mengembalikan (algoritme, hex) atau None jika server tidak mendukung.
+def remote_checksum(ftp, file_name, algorithm):
+    features = server_features(ftp)
+    algorithms = _hash_algorithms(features)
+    try:
+        for candidate, kind in ((HASH_NAMES.get(algorithm), algorithm), ('CRC32', 'crc32')):
+            if candidate in algorithms:
+                ftp.sendcmd(f'OPTS HASH {candidate}')
+                # Balasan: "213 SHA-256 0-1234 <hex> <nama file>"
+                return kind, ftp.sendcmd(f'HASH {file_name}').split()[3].lower()
+        if 'XCRC' in features:
+            return 'crc32', ftp.sendcmd(f'XCRC {file_name}').split()[1].lower()
+    except (ftplib.error_perm, IndexError) as e:
+        logging.warning(f"Server gagal memberi checksum untuk {file_name}: {e}")
+    return None
+
+# Pastikan salinan lokal lengkap dan sama dengan file di server sebelum DELE.
+# `size` dari snapshot MLSD; jika None, ukuran diminta dengan SIZE.
+# `local_path` None berarti salinan tidak berupa file (misalnya member segmen
+# arsip); ukurannya diberikan lewat `local_size`.
+# Melempar ValueError jika ada yang tidak cocok.
+def verify_download(ftp, file_name, local_path, checksum, size=None, local_size=None):
+    if local_path is not None:
+        local_size = os.path.getsize(local_path)
+    if size is None:
+        try:
+            size = ftp.size(file_name)
+        except ftplib.error_perm:
+            size = None
+    if size is not None and local_size != size:
+        raise ValueError(f"Ukuran {file_name} tidak cocok: lokal {local_size}, FTP {size}")
+    if checksum is None:
+        return None
+    remote = remote_checksum(ftp, file_name, checksum.algorithm)
+    if remote is not None:
+        kind, value = remote
+        local = checksum.hexdigest() if kind == checksum.algorithm else f'{checksum.crc32:08x}'
+        if kind == 'crc32' and not checksum.crc and local_path is not None:
+            # CRC32 tidak dihitung saat unduh (misalnya unduhan dari run sebelumnya)
+            local = f'{StreamChecksum(checksum.algorithm, crc=True).update_from_file(local_path).crc32:08x}'
+        if int(local, 16) != int(value, 16):
+            raise ValueError(f"Checksum {kind} {file_name} tidak cocok: lokal {local}, FTP {value}")
+    return remote
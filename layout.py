@@ -0,0 +1,135 @@
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from ftp_listing import parse_day
+
+# Tata letak arsip lokal:
+# 'flat' = semua file langsung di LOCAL_DIR (perilaku lama),
+# 'date' = LOCAL_DIR/YYYY/MM/DD/ dari prefix nama 'YYYYMMDD_' atau createdAt MongoDB
+LAYOUTS = ('flat', 'date')
+
+# Subdirektori untuk file tanpa tanggal pada layout 'date'
+UNDATED_DIR = '_undated'
+
+# Subdirektori relatif untuk satu file sesuai layout
+def shard_for(file_name, layout, created_at=None):
+    if layout == 'flat':
+        return ''
+    if layout != 'date':
+        raise ValueError(f"Layout tidak dikenal: {layout}")
+    day = parse_day(file_name)
+    if day is not None:
+        return os.path.join(day[:4], day[4:6], day[6:8])
+    if created_at is not None:
+        return created_at.strftime(os.path.join('%Y', '%m', '%d'))
+    return UNDATED_DIR
+
+# Arsip lokal dengan layout tertentu dan indeks nama -> path (SQLite mode WAL)
+# agar pencarian file tidak perlu menelusuri direktori.
+# `index_path` None = tanpa indeks.
+class ArchiveLayout:
+    def __init__(self, root, layout='flat', index_path=None):
+        self.root = root
+        self.layout = layout
+        self._created = set()
+        self._lock = threading.Lock()
+        self._conn = None
+        if index_path:
+            self._conn = sqlite3.connect(index_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, path TEXT, size INTEGER, updated_at REAL)'
+            )
+
+    # Path lokal untuk file; direktori shard dibuat sekali saja per proses
+    def path_for(self, file_name, created_at=None):
+        directory = os.path.join(self.root, shard_for(file_name, self.layout, created_at))
+        if directory not in self._created:
+            os.makedirs(directory, exist_ok=True)
+            self._created.add(directory)
+        return os.path.join(directory, file_name)
+
+    # Catat lokasi akhir file di indeks
+    def record(self, file_name, path):
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO files (name, path, size, updated_at) VALUES (?, ?, ?, ?)',
+                (file_name, path, os.path.getsize(path), time.time())
+            )
+
+    # Lokasi file dari indeks, atau None jika tidak tercatat
+    def lookup(self, file_name):
+        if self._conn is None:
+            return None
+        with self._lock:
+            row = self._conn.execute('SELECT path FROM files WHERE name = ?', (file_name,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+
+# Pindahkan file yang masih datar di `root` ke layout arsip, di tempat (rename
+# pada sistem file yang sama), dan catat setiap file di indeks
+def migrate(archive, suffix='.jpg'):
+    moved = indexed = 0
+    with os.scandir(archive.root) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.lower().endswith(suffix):
+                continue
+            target = archive.path_for(entry.name)
+            if target != entry.path:
+                if os.path.exists(target):
+                    logging.warning(f"{target} sudah ada, {entry.path} tidak dipindahkan.")
+                    continue
+                os.rename(entry.path, target)
+                moved += 1
+            archive.record(entry.name, target)
+            indexed += 1
+            if indexed % 10000 == 0:
+                logging.info(f"Migrasi: {indexed} file diproses, {moved} dipindahkan.")
+    logging.info(f"Migrasi selesai: {indexed} file diindeks, {moved} dipindahkan.")
+    return moved
+
+# Perintah: migrasi direktori datar ke layout baru, atau cari lokasi file
+def main():
+    from dotenv import load_dotenv
+    from log_setup import setup_logging
+
+    load_dotenv()
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Tata letak arsip lokal hasil housekeeping FTP")
+    parser.add_argument('--local-dir', default=os.getenv('LOCAL_DIR', '/tmp'))
+    parser.add_argument('--layout', choices=LAYOUTS, default=os.getenv('LOCAL_LAYOUT', 'date'))
+    parser.add_argument('--index', default=os.getenv('ARCHIVE_INDEX_FILE', 'archive_index.db'))
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('migrate', help="Pindahkan file datar di LOCAL_DIR ke layout arsip")
+    lookup = commands.add_parser('lookup', help="Cari lokasi file dari indeks")
+    lookup.add_argument('names', nargs='+')
+    args = parser.parse_args()
+
+    archive = ArchiveLayout(args.local_dir, args.layout, args.index)
+    try:
+        if args.command == 'migrate':
+            migrate(archive)
+        else:
+            missing = False
+            for name in args.names:
+                path = archive.lookup(name)
+                print(f"{name}\t{path or '-'}")
+                missing = missing or path is None
+            if missing:
+                sys.exit(1)
+    finally:
+        archive.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Atribut bawaan LogRecord; sisanya dianggap field tambahan (extra)
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+# Satu baris JSON per record, termasuk field dari `extra`
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RESERVED})
+        return json.dumps(entry, default=str)
+
+_listener = None
+
+# Pasang logging: transfer thread hanya memasukkan record ke antrean, sedangkan
+# penulisan ke file dan konsol dikerjakan QueueListener di thread terpisah.
+# Dibaca dari .env: LOG_FILE, LOG_FORMAT ('text' atau 'json' untuk JSON lines),
+# LOG_LEVEL (DEBUG menampilkan log per tahap setiap file)
+def setup_logging(log_file=None, log_format=None, level=None):
+    global _listener
+    if _listener is not None:
+        return
+    log_file = log_file or os.getenv('LOG_FILE', 'ftp_housekeeping.log')
+    log_format = log_format or os.getenv('LOG_FORMAT', 'text')
+    level = level or os.getenv('LOG_LEVEL', 'INFO')
+    formatter = JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.FileHandler(log_file), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(records)]
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+# Baris progres berkala menggantikan log per file: jumlah file, byte, dan laju
+class ProgressReporter:
+    def __init__(self, log=logging, total=None, interval=None):
+        self.log = log
+        self.total = total
+        # Detik antar baris progres
+        self.interval = interval or float(os.getenv('PROGRESS_INTERVAL', 10))
+        self.files = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._report_periodically, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def add(self, size=0):
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+
+    def report(self):
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        with self._lock:
+            files, size = self.files, self.bytes
+        total = f"/{self.total}" if self.total is not None else ''
+        self.log.info(
+            f"Progres: {files}{total} file, {size / 1e6:.1f} MB, {files / elapsed:.1f} file/s, "
+            f"{size / elapsed / 1e6:.2f} MB/s",
+            extra={'progress_files': files, 'progress_bytes': size, 'elapsed_s': round(elapsed, 1)}
+        )
+
+    def _report_periodically(self):
+        while not self._stopped.wait(self.interval):
+            self.report()
+
+    def stop(self):
+        self._stopped.set()
+        self.report()
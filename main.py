@@ -1,8 +1,20 @@
+import asyncio
 import os
 import ftplib
 import logging
+import tempfile
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from log_setup import setup_logging
+from transfer import FtpPool, download_file, download_stream
+from pipeline import DeleteQueue
+from integrity import new_checksum, verify_download
+from checkpoint import Checkpoint
+from layout import ArchiveLayout
+from segments import SegmentWriter
+from ftp_listing import take_snapshot
+from planner import Plan
+from async_transfer import FtpEndpoint, run_async_transfers
 
 # Muat variabel lingkungan dari file .env
 load_dotenv()
@@ -14,16 +26,17 @@ FTP_PASS = os.getenv('FTP_PASS')
 FTP_PORT = int(os.getenv('FTP_PORT'))
 FTP_FOLDER = os.getenv('FTP_FOLDER')
 LOCAL_DIR = os.getenv('LOCAL_DIR')
+CHECKPOINT_FILE = os.getenv('CHECKPOINT_FILE', 'checkpoint.db')  # Journal tahapan per file untuk melanjutkan run yang terputus
+TRANSFER_BACKEND = os.getenv('TRANSFER_BACKEND', 'thread')  # 'thread' (ftplib) atau 'asyncio'
+FTP_WORKERS = int(os.getenv('FTP_WORKERS', 4))  # Jumlah sesi FTP paralel untuk backend asyncio
+LOCAL_LAYOUT = os.getenv('LOCAL_LAYOUT', 'flat')  # 'flat' atau 'date' (LOCAL_DIR/YYYY/MM/DD)
+ARCHIVE_INDEX_FILE = os.getenv('ARCHIVE_INDEX_FILE', 'archive_index.db')  # Indeks nama file -> lokasi lokal
+SEGMENT_PERIOD = os.getenv('SEGMENT_PERIOD')  # 'day'/'month' = tulis langsung ke segmen tar, bukan file terpisah
+SEGMENT_COMPRESS = os.getenv('SEGMENT_COMPRESS', 'none')  # 'none' atau 'zstd'
+SEGMENT_MAX_BYTES = int(os.getenv('SEGMENT_MAX_BYTES', 1024 ** 3))  # Ukuran maksimal satu segmen
 
-# Konfigurasi logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('ftp_housekeeping.log'),  # Log ke file
-        logging.StreamHandler()  # Log ke konsol
-    ]
-)
+# Konfigurasi logging (teks atau JSON lines, ditulis dari thread terpisah)
+setup_logging()
 
 # Fungsi untuk menghubungkan ke FTP
 def connect_ftp():
@@ -39,43 +52,114 @@ def connect_ftp():
         raise
 
 # Fungsi untuk memindahkan file JPG dari FTP ke lokal dan menghapusnya dari FTP
-def move_and_delete_jpg_files(ftp, local_dir, date_filter=None):
+# `select` memilih entri dari snapshot FTP; tanpa `select` semua file JPG dipindahkan
+# `plan` (dari `python planner.py ftp`) menggantikan snapshot baru dengan entri rencana
+def move_and_delete_jpg_files(ftp, local_dir, select=None, plan=None):
     try:
-        files = ftp.nlst()
-        logging.info(f"Menemukan {len(files)} file di FTP.")
-        for file in files:
-            if file.lower().endswith('.jpg'):
-                if date_filter:
-                    try:
-                        file_date = datetime.strptime(file.split('_')[0], '%Y%m%d')
-                        if date_filter(file_date):
-                            local_path = os.path.join(local_dir, file)
-                            with open(local_path, 'wb') as local_file:
-                                ftp.retrbinary(f'RETR {file}', local_file.write)
-                            ftp.delete(file)
-                            logging.info(f"Berhasil memindahkan dan menghapus: {file}")
-                    except Exception as e:
-                        logging.error(f"Gagal memproses file {file}: {e}")
+        checkpoint = Checkpoint(CHECKPOINT_FILE)
+        archive = ArchiveLayout(local_dir, LOCAL_LAYOUT, ARCHIVE_INDEX_FILE)
+        if plan is not None:
+            entries = list(plan.entries())
+            logging.info(f"Rencana {plan.path} ({plan.header['selection']}, dibuat {plan.age()} yang lalu): {len(entries)} file.")
+        else:
+            snapshot = take_snapshot(ftp)
+            entries = select(snapshot) if select else snapshot.all()
+            logging.info(f"Menemukan {len(snapshot)} file di FTP, {len(entries)} file dipilih.")
+        if SEGMENT_PERIOD:
+            move_to_segments(ftp, local_dir, entries)
+            checkpoint.close()
+            archive.close()
+            return
+        if TRANSFER_BACKEND == 'asyncio':
+            endpoint = FtpEndpoint(FTP_HOST, FTP_PORT, FTP_USER, FTP_PASS, FTP_FOLDER)
+            asyncio.run(run_async_transfers(
+                endpoint, entries, local_dir, FTP_WORKERS, name_of=lambda entry: entry.name, checkpoint=checkpoint,
+                path_of=lambda entry: archive.path_for(entry.name),
+                on_moved=lambda entry, checksum: archive.record(entry.name, archive.path_for(entry.name))
+            ))
+            checkpoint.close()
+            archive.close()
+            return
+        # DELE dikirim per batch lewat sesi kontrol kedua agar unduhan tidak menunggu
+        def deleted(file, ok):
+            if ok:
+                archive.record(file, archive.path_for(file))
+                checkpoint.finish(file)
+                logging.info(f"Berhasil memindahkan dan menghapus: {file}")
+
+        delete_pool = FtpPool(connect_ftp, 1)
+        deletes = DeleteQueue(delete_pool, deleted)
+        for entry in entries:
+            file = entry.name
+            try:
+                # Lewati unduhan yang sudah selesai pada run sebelumnya
+                local_path = archive.path_for(file)
+                checksum = new_checksum(ftp)
+                if checkpoint.state(file).get('downloaded') and os.path.exists(local_path):
+                    if checksum is not None:
+                        checksum.update_from_file(local_path)
                 else:
-                    try:
-                        local_path = os.path.join(local_dir, file)
-                        with open(local_path, 'wb') as local_file:
-                            ftp.retrbinary(f'RETR {file}', local_file.write)
-                        ftp.delete(file)
-                        logging.info(f"Berhasil memindahkan dan menghapus: {file}")
-                    except Exception as e:
-                        logging.error(f"Gagal memproses file {file}: {e}")
+                    download_file(ftp, file, local_path, size=entry.size, checksum=checksum)
+                    checkpoint.mark(file, 'downloaded')
+                # Hapus dari FTP hanya jika ukuran dan checksum cocok
+                verify_download(ftp, file, local_path, checksum, entry.size)
+                deletes.submit(file)
+            except Exception as e:
+                logging.error(f"Gagal memproses file {file}: {e}")
+        deletes.close()
+        delete_pool.close()
+        checkpoint.close()
+        archive.close()
     except Exception as e:
         logging.error(f"Gagal memindahkan file: {e}")
 
+# Mode segmen: setiap file diunduh ke buffer lalu ditulis sebagai member segmen
+# tar per hari/bulan, diverifikasi, baru dihapus dari FTP
+def move_to_segments(ftp, local_dir, entries):
+    segments = SegmentWriter(
+        local_dir, SEGMENT_PERIOD, None if SEGMENT_COMPRESS == 'none' else SEGMENT_COMPRESS, SEGMENT_MAX_BYTES
+    )
+    archived = {}
+
+    def deleted(file, ok):
+        segment_path = archived.pop(file)
+        if ok:
+            logging.info(f"Berhasil memindahkan {file} ke {segment_path} dan menghapusnya dari FTP")
+
+    delete_pool = FtpPool(connect_ftp, 1)
+    deletes = DeleteQueue(delete_pool, deleted)
+    try:
+        for entry in entries:
+            file = entry.name
+            try:
+                checksum = new_checksum(ftp)
+                with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as buffer:
+                    received = download_stream(ftp, file, buffer, size=entry.size, checksum=checksum)
+                    buffer.seek(0)
+                    segment_path, member = segments.append(file, buffer, received, checksum)
+                try:
+                    verify_download(ftp, file, None, checksum, entry.size, local_size=received)
+                except Exception:
+                    # Member yang gagal dibuang agar run berikutnya tidak menambah member ganda
+                    segments.discard(segment_path, member)
+                    raise
+                archived[file] = segment_path
+                deletes.submit(file)
+            except Exception as e:
+                logging.error(f"Gagal memproses file {file}: {e}")
+    finally:
+        deletes.close()
+        delete_pool.close()
+        segments.close()
+
 # Fungsi untuk memindahkan file JPG dari 1 hari kemarin
 def move_yesterday_files():
     try:
-        yesterday = datetime.now() - timedelta(days=1)
-        date_filter = lambda x: x.date() == yesterday.date()
+        yesterday = (datetime.now() - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        select = lambda snapshot: snapshot.on(yesterday)
         logging.info("Memindahkan file dari 1 hari kemarin...")
         ftp = connect_ftp()
-        move_and_delete_jpg_files(ftp, LOCAL_DIR, date_filter)
+        move_and_delete_jpg_files(ftp, LOCAL_DIR, select)
         ftp.quit()
     except Exception as e:
         logging.error(f"Gagal menjalankan move_yesterday_files: {e}")
@@ -85,10 +169,10 @@ def move_last_month_files():
     try:
         today = datetime.now()
         last_month = today.replace(day=1) - timedelta(days=1)
-        date_filter = lambda x: x.year == last_month.year and x.month == last_month.month
+        select = lambda snapshot: snapshot.month(last_month.year, last_month.month)
         logging.info("Memindahkan file dari 1 bulan lalu...")
         ftp = connect_ftp()
-        move_and_delete_jpg_files(ftp, LOCAL_DIR, date_filter)
+        move_and_delete_jpg_files(ftp, LOCAL_DIR, select)
         ftp.quit()
     except Exception as e:
         logging.error(f"Gagal menjalankan move_last_month_files: {e}")
@@ -103,6 +187,17 @@ def move_all_files():
     except Exception as e:
         logging.error(f"Gagal menjalankan move_all_files: {e}")
 
+# Fungsi untuk memindahkan file JPG persis sesuai rencana yang sudah ditinjau
+def move_planned_files(path):
+    try:
+        plan = Plan(path).require('ftp')
+        logging.info(f"Memindahkan file sesuai rencana {plan.path}...")
+        ftp = connect_ftp()
+        move_and_delete_jpg_files(ftp, LOCAL_DIR, plan=plan)
+        ftp.quit()
+    except Exception as e:
+        logging.error(f"Gagal menjalankan move_planned_files: {e}")
+
 # Fungsi utama untuk menjalankan script berdasarkan pilihan
 def main():
     try:
@@ -110,7 +205,8 @@ def main():
         print("1. Pindahkan file JPG dari 1 hari kemarin")
         print("2. Pindahkan file JPG dari 1 bulan lalu")
         print("3. Pindahkan semua file JPG")
-        choice = input("Masukkan pilihan (1/2/3): ")
+        print("4. Jalankan rencana dari file (python planner.py ftp)")
+        choice = input("Masukkan pilihan (1/2/3/4): ")
 
         if choice == '1':
             move_yesterday_files()
@@ -118,6 +214,8 @@ def main():
             move_last_month_files()
         elif choice == '3':
             move_all_files()
+        elif choice == '4':
+            move_planned_files(input("File rencana: "))
         else:
             logging.warning("Pilihan tidak valid")
     except Exception as e:
@@ -0,0 +1,70 @@
+import logging
+import time
+from contextlib import contextmanager
+
+# Metrik Prometheus/OpenMetrics opsional untuk jalur transfer.
+# Jika prometheus_client tidak terpasang, semua metrik menjadi no-op.
+try:
+    from prometheus_client import Counter, Gauge, Histogram, start_http_server
+except ImportError:
+    Counter = Gauge = Histogram = start_http_server = None
+
+# Metrik pengganti yang tidak melakukan apa-apa
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+def _metric(kind, *args, **kwargs):
+    if kind is None:
+        return _NoopMetric()
+    return kind(*args, **kwargs)
+
+# Bucket latensi per fase: dari milidetik (DELE) sampai menit (RETR file besar)
+PHASE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+FILES_MOVED = _metric(Counter, 'ftp_housekeeping_files_moved_total', 'File yang selesai dipindahkan', ['site'])
+BYTES_MOVED = _metric(Counter, 'ftp_housekeeping_bytes_moved_total', 'Byte yang diunduh dari FTP', ['site'])
+FAILURES = _metric(
+    Counter, 'ftp_housekeeping_failures_total', 'Kegagalan per penyebab (connect, retr, dele, mongo)', ['site', 'reason']
+)
+PHASE_SECONDS = _metric(
+    Histogram, 'ftp_housekeeping_phase_seconds', 'Latensi per fase (connect, retr, dele, mongo_update)',
+    ['site', 'phase'], buckets=PHASE_BUCKETS
+)
+QUEUE_DEPTH = _metric(Gauge, 'ftp_housekeeping_queue_depth', 'Jumlah item yang menunggu di antrean', ['site', 'stage'])
+ACTIVE_CONNECTIONS = _metric(Gauge, 'ftp_housekeeping_active_connections', 'Sesi FTP yang sedang terbuka', ['site'])
+
+# Ukur durasi satu fase; kegagalan ikut dihitung dengan penyebab `reason`
+@contextmanager
+def track_phase(site, phase, reason=None):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        FAILURES.labels(site, reason or phase).inc()
+        raise
+    finally:
+        PHASE_SECONDS.labels(site, phase).observe(time.perf_counter() - started)
+
+# Buka endpoint HTTP /metrics di port lokal; port 0 berarti nonaktif
+def start_metrics_server(port, addr='127.0.0.1'):
+    if not port:
+        return False
+    if start_http_server is None:
+        logging.warning("prometheus_client tidak terpasang; endpoint metrik tidak dijalankan.")
+        return False
+    start_http_server(port, addr=addr)
+    logging.info(f"Endpoint metrik berjalan di http://{addr}:{port}/metrics")
+    return True
@@ -0,0 +1,234 @@
+import logging
+import os
+import threading
+from datetime import datetime
+from bson import json_util
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure, PyMongoError
+from metrics import track_phase
+
+# Hanya field yang dibutuhkan mover; dokumen history lengkap tidak ikut dimuat
+HISTORY_PROJECTION = {'_id': 1, 'value': 1, 'createdAt': 1}
+DEFAULT_BATCH_SIZE = 1000
+
+# Index pendukung untuk query dokumen yang belum diproses
+HISTORY_INDEX = [('process', 1), ('createdAt', 1)]
+HISTORY_INDEX_NAME = 'process_1_createdAt_1'
+
+# Index untuk membaca dokumen urut nama file (rekonsiliasi dengan listing FTP)
+VALUE_INDEX = [('value', 1)]
+VALUE_INDEX_NAME = 'value_1'
+
+# Query dokumen yang belum diproses, opsional dibatasi rentang createdAt [start, end)
+def unprocessed_query(start=None, end=None):
+    query = {'process': {'$ne': True}}
+    created_at = {}
+    if start is not None:
+        created_at['$gte'] = start
+    if end is not None:
+        created_at['$lt'] = end
+    if created_at:
+        query['createdAt'] = created_at
+    return query
+
+# Buat index (bawaan: process, createdAt) jika belum ada; aman dipanggil setiap start
+def ensure_history_index(collection, keys=HISTORY_INDEX, name=HISTORY_INDEX_NAME):
+    try:
+        collection.create_index(keys, name=name)
+        logging.info(f"Index {name} siap.")
+    except Exception as e:
+        logging.warning(f"Gagal membuat index {name}: {e}")
+
+def _has_stage(plan, stage):
+    if isinstance(plan, dict):
+        if plan.get('stage') == stage:
+            return True
+        return any(_has_stage(value, stage) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_stage(value, stage) for value in plan)
+    return False
+
+# Periksa rencana eksekusi query; beri peringatan jika MongoDB memindai seluruh koleksi
+def check_query_plan(collection, query):
+    try:
+        explain = collection.find(query, HISTORY_PROJECTION).explain()
+    except Exception as e:
+        logging.warning(f"Gagal memeriksa rencana query: {e}")
+        return None
+    winning_plan = explain.get('queryPlanner', {}).get('winningPlan', {})
+    if _has_stage(winning_plan, 'COLLSCAN'):
+        logging.warning(f"Query {query} memakai COLLSCAN; periksa index {HISTORY_INDEX_NAME}.")
+        return 'COLLSCAN'
+    logging.info(f"Query {query} memakai index.")
+    return 'IXSCAN'
+
+# Alirkan dokumen history dari cursor per batch, tanpa memuat semuanya ke memori.
+# `sort` dan `limit` opsional, misalnya untuk mode inkremental per batch.
+# `hint` memaksa index tertentu, misalnya agar sort besar tidak dilakukan di memori.
+def iter_history(collection, query=None, batch_size=DEFAULT_BATCH_SIZE, sort=None, limit=0, hint=None):
+    cursor = collection.find(query or {}, HISTORY_PROJECTION).batch_size(batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    if hint:
+        cursor = cursor.hint(hint)
+    if limit:
+        cursor = cursor.limit(limit)
+    try:
+        for document in cursor:
+            yield document
+    finally:
+        cursor.close()
+
+# Hitung jumlah dokumen; tanpa filter cukup pakai metadata koleksi agar instan
+def count_history(collection, query=None, limit=0):
+    try:
+        if not query and not limit:
+            return collection.estimated_document_count()
+        if limit:
+            return collection.count_documents(query or {}, limit=limit)
+        return collection.count_documents(query)
+    except Exception as e:
+        logging.warning(f"Gagal menghitung dokumen di MongoDB: {e}")
+        return None
+
+# Tampung update status lalu kirim sebagai bulk_write unordered per batch.
+# Setiap update ditulis dulu ke file spool lokal sehingga update yang belum
+# sempat dikirim (crash/sinyal) dikirim ulang pada run berikutnya.
+class StatusWriter:
+    def __init__(self, collection, spool_path, batch_size=500, flush_interval=5.0, name='default'):
+        self.collection = collection
+        self.name = name
+        self.spool_path = os.path.abspath(spool_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._pending = []
+        self._unsynced = 0
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+
+        # Kirim ulang update yang tertinggal dari run sebelumnya
+        self._pending.extend(self._read_spool())
+        if self._pending:
+            logging.info(f"Memulihkan {len(self._pending)} update status dari {spool_path}.")
+        self._spool = open(spool_path, 'a')
+        self.flush()
+
+        self._timer = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._timer.start()
+
+    def _read_spool(self):
+        if not os.path.exists(self.spool_path):
+            return []
+        with open(self.spool_path) as spool:
+            return [json_util.loads(line) for line in spool if line.strip()]
+
+    # Tandai dokumen sudah diproses; `fields` ikut disimpan di dokumen.
+    # Spool di-fsync paling lambat setiap `batch_size` update (dan lewat sync()).
+    def mark_processed(self, document_id, **fields):
+        entry = {'_id': document_id, 'set': {'process': True, 'updatedAt': datetime.utcnow(), **fields}}
+        with self._lock:
+            self._spool.write(json_util.dumps(entry) + '\n')
+            self._spool.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.batch_size:
+                self.sync()
+            self._pending.append(entry)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    # Pastikan update yang sudah ditulis ke spool tersimpan di disk; dipanggil
+    # sebelum DELE berikutnya agar status file yang sudah dihapus tidak hilang
+    # saat mesin mati mendadak
+    def sync(self):
+        with self._lock:
+            if self._unsynced and not self._spool.closed:
+                os.fsync(self._spool.fileno())
+                self._unsynced = 0
+
+    # Kirim semua update yang tertunda; jika gagal, update tetap di antrean
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return True
+            batch = list(self._pending)
+            try:
+                with track_phase(self.name, 'mongo_update', 'mongo'):
+                    self.collection.bulk_write(
+                        [UpdateOne({'_id': entry['_id']}, {'$set': entry['set']}) for entry in batch],
+                        ordered=False
+                    )
+            except Exception as e:
+                logging.error(f"Gagal mengirim {len(batch)} update status ke MongoDB: {e}")
+                return False
+            del self._pending[:len(batch)]
+            self.written += len(batch)
+            self._rewrite_spool()
+            return True
+
+    # Spool hanya berisi update yang belum dikonfirmasi MongoDB
+    def _rewrite_spool(self):
+        self._spool.close()
+        with open(self.spool_path, 'w') as spool:
+            for entry in self._pending:
+                spool.write(json_util.dumps(entry) + '\n')
+            spool.flush()
+            os.fsync(spool.fileno())
+        self._spool = open(self.spool_path, 'a')
+        self._unsynced = 0
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    # Flush terakhir saat proses selesai atau menerima sinyal berhenti
+    def close(self):
+        self._closed.set()
+        ok = self.flush()
+        with self._lock:
+            self._spool.close()
+        if not ok:
+            logging.warning(f"{len(self._pending)} update status tersimpan di {self.spool_path} untuk run berikutnya.")
+        logging.info(f"Total {self.written} update status dikirim ke MongoDB.")
+
+# Thread yang memanggil `on_insert()` setiap ada dokumen baru di koleksi lewat
+# change stream MongoDB (butuh replica set). Jika server tidak mendukung change
+# stream, thread berhenti dan run tetap berjalan sesuai jadwal biasa.
+class InsertWatcher(threading.Thread):
+    def __init__(self, collection, on_insert, max_await_ms=1000):
+        super().__init__(name='insert-watcher', daemon=True)
+        self.collection = collection
+        self.on_insert = on_insert
+        self.max_await_ms = max_await_ms
+        self._stopped = threading.Event()
+
+    def run(self):
+        resume_token = None
+        delay = 1
+        while not self._stopped.is_set():
+            try:
+                with self.collection.watch(
+                    [{'$match': {'operationType': 'insert'}}],
+                    resume_after=resume_token, max_await_time_ms=self.max_await_ms
+                ) as stream:
+                    logging.info("Change stream MongoDB aktif, run dipicu oleh dokumen baru.")
+                    delay = 1
+                    while not self._stopped.is_set() and stream.alive:
+                        if stream.try_next() is not None:
+                            self.on_insert()
+                        resume_token = stream.resume_token
+            except OperationFailure as e:
+                if resume_token is None:
+                    logging.warning(f"Change stream MongoDB tidak tersedia, hanya memakai jadwal: {e}")
+                    return
+                # Token kedaluwarsa (oplog sudah berputar): mulai lagi dari sekarang
+                logging.warning(f"Change stream tidak bisa dilanjutkan, mulai ulang: {e}")
+                resume_token = None
+            except PyMongoError as e:
+                logging.warning(f"Change stream terputus: {e}. Mencoba lagi dalam {delay} detik...")
+                self._stopped.wait(delay)
+                delay = min(delay * 2, 60)
+
+    def stop(self):
+        self._stopped.set()
@@ -1,121 +1,40 @@
-import os
-import ftplib
 import logging
-import schedule
-import time
-from pymongo import MongoClient
-from datetime import datetime, timedelta
+import os
+import signal
+import sys
 from dotenv import load_dotenv
+from log_setup import setup_logging
+from mover import site_from_env, SiteRunner
+from mongo_utils import InsertWatcher
+from scheduler import Scheduler
+from metrics import start_metrics_server
 
 # Muat variabel lingkungan dari file .env
 load_dotenv()
 
-# Konfigurasi FTP dari .env
-FTP_HOST = os.getenv('FTP_HOST')
-FTP_USER = os.getenv('FTP_USER')
-FTP_PASS = os.getenv('FTP_PASS')
-FTP_PORT = int(os.getenv('FTP_PORT', 21))
-FTP_FOLDER = os.getenv('FTP_FOLDER', '/')
-LOCAL_DIR = os.getenv('LOCAL_DIR', '/tmp')
-
-# Konfigurasi MongoDB dari .env
-MONGO_URI = os.getenv('MONGO_URI')
-MONGO_DB_NAME = os.getenv('MONGO_DB', 'default_db')
-MONGO_COLLECTION = os.getenv('MONGO_COLLECTION', 'default_collection')
+# Konfigurasi FTP, direktori lokal, dan MongoDB dari .env.
+# Bawaan mode 'incremental': setiap run hanya mengambil dokumen setelah watermark
+# terakhir; MOVE_MODE=daily memakai jendela satu hari UTC seperti sebelumnya.
+SITE = site_from_env('default', mode='incremental')
+WATCH_NEW_DOCUMENTS = os.getenv('WATCH_NEW_DOCUMENTS', '1') == '1'  # Picu run dari change stream MongoDB
+TRIGGER_DEBOUNCE = float(os.getenv('TRIGGER_DEBOUNCE', 10))  # Jeda minimal (detik) antar run yang dipicu dokumen baru
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', 60))  # Ping MongoDB/NOOP FTP di antara run, 0 = nonaktif
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))  # Port endpoint /metrics lokal, 0 = nonaktif
 
-# Konfigurasi logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('ftp_housekeeping.log'),
-        logging.StreamHandler()
-    ]
-)
+# Konfigurasi logging (teks atau JSON lines, ditulis dari thread terpisah)
+setup_logging()
 
-# Koneksi ke MongoDB
-def connect_mongodb():
-    try:
-        client = MongoClient(MONGO_URI)
-        db = client[MONGO_DB_NAME]
-        logging.info("Berhasil terhubung ke MongoDB.")
-        return db[MONGO_COLLECTION]
-    except Exception as e:
-        logging.error(f"Gagal terhubung ke MongoDB: {e}")
-        raise
-
-# Koneksi ke FTP
-def connect_ftp():
-    try:
-        ftp = ftplib.FTP()
-        ftp.connect(FTP_HOST, FTP_PORT)
-        ftp.login(FTP_USER, FTP_PASS)
-        ftp.cwd(FTP_FOLDER)
-        logging.info("Berhasil terhubung ke FTP.")
-        return ftp
-    except Exception as e:
-        logging.error(f"Gagal terhubung ke FTP: {e}")
-        raise
+# Satu runner untuk seluruh umur proses: MongoClient dan pool FTP tetap hangat di antara run
+runner = None
 
 # Fungsi untuk memindahkan file berdasarkan data dari MongoDB
 def move_files_from_database():
+    global runner
     try:
-        # Koneksi ke MongoDB
-        logging.info("Menghubungkan ke MongoDB...")
-        collection = connect_mongodb()
-
-        # Koneksi ke FTP
-        logging.info("Menghubungkan ke FTP...")
-        ftp = connect_ftp()
-
-        # Mendapatkan tanggal hari ini
-        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        tomorrow = today + timedelta(days=1)
-
-        # Ambil dokumen dengan createdAt di antara hari ini dan besok
-        logging.info(f"Mengambil dokumen dari MongoDB untuk tanggal {today.strftime('%Y-%m-%d')}...")
-        files_to_process = list(
-            collection.find({
-                "createdAt": {"$gte": today, "$lt": tomorrow}
-            })
-        )
-        total_files = len(files_to_process)
-        logging.info(f"Menemukan {total_files} file untuk diproses.")
-
-        if total_files == 0:
-            logging.info("Tidak ada file untuk diproses. Proses selesai.")
-            return
-
-        # Iterasi setiap dokumen
-        for idx, document in enumerate(files_to_process, start=1):
-            file_name = document['value']
-            local_path = os.path.join(LOCAL_DIR, file_name)
-
-            logging.info(f"[{idx}/{total_files}] Memproses file: {file_name}")
-            try:
-                # Unduh file dari FTP
-                logging.info(f"Mengunduh file {file_name} dari FTP...")
-                with open(local_path, 'wb') as local_file:
-                    ftp.retrbinary(f'RETR {file_name}', local_file.write)
-                logging.info(f"File {file_name} berhasil diunduh ke {local_path}.")
-
-                # Hapus file dari FTP
-                logging.info(f"Menghapus file {file_name} dari FTP...")
-                ftp.delete(file_name)
-                logging.info(f"File {file_name} berhasil dihapus dari FTP.")
-
-                # Perbarui status dokumen di MongoDB
-                logging.info(f"Memperbarui status dokumen di MongoDB untuk file {file_name}...")
-                collection.update_one(
-                    {"_id": document["_id"]},
-                    {"$set": {"process": True, "updatedAt": datetime.utcnow()}}
-                )
-                logging.info(f"Status berhasil diperbarui untuk file: {file_name}")
-            except Exception as e:
-                logging.error(f"Gagal memproses file {file_name}: {e}")
-
-        ftp.quit()
-        logging.info("Koneksi ke FTP ditutup. Proses selesai.")
+        if runner is None:
+            logging.info("Menghubungkan ke MongoDB dan FTP...")
+            runner = SiteRunner(SITE, warm=True)
+        runner.run()
     except Exception as e:
         logging.error(f"Gagal menjalankan move_files_from_database: {e}")
 
@@ -126,11 +45,41 @@ def main():
     except Exception as e:
         logging.error(f"Terjadi kesalahan dalam fungsi main: {e}")
 
-# Menjadwalkan fungsi main untuk berjalan setiap hari pukul 00:00
-schedule.every().day.at("00:00").do(main)
+# Cek kesehatan koneksi hangat di antara run
+def health_check():
+    if runner is not None:
+        runner.health_check(HEALTH_CHECK_INTERVAL)
+
+# Mode incremental berjalan setiap SITE.run_interval menit (RUN_INTERVAL_MINUTES)
+# dalam batch kecil dan juga segera setelah dokumen baru masuk; SITE.run_cron
+# (RUN_CRON) mengganti jadwal; mode lain dijadwalkan setiap hari pukul 00:00
+def build_scheduler():
+    scheduler = Scheduler()
+    if SITE.run_cron:
+        scheduler.add_job('move', main, cron=SITE.run_cron, debounce=TRIGGER_DEBOUNCE)
+    elif SITE.mode == 'incremental':
+        scheduler.add_job('move', main, interval=SITE.run_interval * 60, debounce=TRIGGER_DEBOUNCE)
+    else:
+        scheduler.add_job('move', main, cron='0 0 * * *')
+    if HEALTH_CHECK_INTERVAL > 0:
+        scheduler.add_job('health', health_check, interval=HEALTH_CHECK_INTERVAL)
+    return scheduler
 
 if __name__ == "__main__":
-    logging.info("Menjalankan scheduler...")
-    while True:
-        schedule.run_pending()
-        time.sleep(1)  # Tunggu 1 detik untuk menghindari penggunaan CPU yang tinggi
+    # SIGTERM (pm2 stop/restart) diubah menjadi SystemExit agar flush terakhir tetap jalan
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    start_metrics_server(METRICS_PORT)
+    scheduler = build_scheduler()
+    watcher = None
+    try:
+        runner = SiteRunner(SITE, warm=True)
+        if WATCH_NEW_DOCUMENTS and SITE.mode == 'incremental':
+            watcher = InsertWatcher(runner.collection, lambda: scheduler.trigger('move'))
+            watcher.start()
+        logging.info("Menjalankan scheduler...")
+        scheduler.run_forever()
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        if runner is not None:
+            runner.close()
@@ -0,0 +1,36 @@
+import logging
+import os
+import signal
+import sys
+from dotenv import load_dotenv
+from log_setup import setup_logging
+from mover import site_from_env, SiteRunner
+from metrics import start_metrics_server
+
+# Muat variabel lingkungan dari file .env
+load_dotenv()
+
+# Konfigurasi FTP, direktori lokal, dan MongoDB dari .env. Snapshot MLSD tidak
+# dipakai karena file baru belum ada di snapshot yang diambil saat mulai.
+SITE = site_from_env('default', snapshot=False)
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))  # Port endpoint /metrics lokal, 0 = nonaktif
+
+# Konfigurasi logging (teks atau JSON lines, ditulis dari thread terpisah)
+setup_logging()
+
+# Pindahkan setiap file begitu dokumen history-nya masuk ke MongoDB
+def main():
+    runner = SiteRunner(SITE, warm=True)
+    try:
+        logging.info(f"Menjalankan mode streaming (metode {SITE.stream_method}, posisi di {SITE.stream_state_file})...")
+        runner.stream()
+    except Exception as e:
+        logging.error(f"Mode streaming berhenti karena kesalahan: {e}")
+    finally:
+        runner.close()
+
+if __name__ == "__main__":
+    # SIGTERM (pm2 stop/restart) diubah menjadi SystemExit agar flush terakhir tetap jalan
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    start_metrics_server(METRICS_PORT)
+    main()
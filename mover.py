@@ -0,0 +1,676 @@
+import asyncio
+import ftplib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import partial
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from transfer import (
+    FtpPool, run_transfers, is_connection_error, check_alive, delete_files, download_file, download_stream
+)
+from pipeline import Stage, run_pipeline
+from ftp_listing import snapshot_from_pool
+from checkpoint import Checkpoint
+from async_transfer import FtpEndpoint, run_async_transfers
+from rate_limiter import RateLimiter
+from metrics import track_phase, FILES_MOVED, BYTES_MOVED
+from log_setup import ProgressReporter
+from integrity import KnownChecksum, new_checksum, remote_checksum, verify_download
+from dedup import DedupStore
+from layout import ArchiveLayout
+from segments import SegmentWriter
+from watermark import Watermark, WatermarkTracker
+from tail import HistoryTail
+from mongo_utils import (
+    iter_history, count_history, StatusWriter, unprocessed_query, ensure_history_index, check_query_plan
+)
+
+# Konfigurasi satu situs: server FTP, direktori lokal, dan koleksi MongoDB.
+# mode 'daily' = dokumen hari ini (UTC), 'all' = semua dokumen yang belum diproses,
+# 'incremental' = dokumen setelah watermark terakhir (lihat watermark.py).
+# backend 'pipeline' (tahap unduh/verifikasi/hapus/status), 'thread' atau 'asyncio'.
+# dedup=True menyimpan isi file sekali per checksum (lihat dedup.py).
+# layout 'flat' atau 'date' (LOCAL_DIR/YYYY/MM/DD), lokasi dicatat di archive_index.
+# segment_period 'day'/'month' menulis file langsung ke segmen tar (lihat segments.py).
+# stream_* mengatur mode streaming (lihat tail.py dan move_stream.py).
+# run_cron / run_interval (menit, mode incremental) = jadwal situs di daemon.py.
+Site = namedtuple('Site', [
+    'name', 'ftp', 'local_dir', 'mongo_uri', 'mongo_db', 'mongo_collection',
+    'mode', 'workers', 'max_files_per_sec', 'max_bytes_per_sec', 'snapshot', 'backend',
+    'status_batch_size', 'status_flush_interval', 'spool_file', 'checkpoint_file', 'noop_check',
+    'delete_workers', 'pipeline_queue_size', 'dedup', 'dedup_index', 'dedup_link',
+    'layout', 'archive_index', 'segment_period', 'segment_compress', 'segment_max_bytes',
+    'watermark_file', 'watermark_lookback', 'watermark_batch', 'watermark_max_attempts',
+    'stream_state_file', 'stream_method', 'stream_poll_interval',
+    'idle_check', 'delete_batch', 'run_cron', 'run_interval',
+], defaults=(
+    'daily', 4, 0, 0, True, 'pipeline',
+    500, 5.0, 'status_spool.jsonl', 'checkpoint.db', False,
+    1, 64, False, 'dedup.db', True,
+    'flat', 'archive_index.db', None, 'none', 1024 ** 3,
+    'watermark.json', 300, 0, 3,
+    'stream_state.json', 'auto', 1.0,
+    30.0, 16, None, 5,
+))
+
+# Baca konfigurasi situs dari .env; `suffix` membedakan situs (misalnya '_HYLAB').
+# `defaults` mengganti nilai bawaan untuk variabel yang tidak di-set.
+def site_from_env(name, suffix='', **defaults):
+    fallback = Site(name, None, None, None, None, None)._replace(**defaults)
+    tag = suffix.lower()
+
+    def env(key, default=None):
+        return os.getenv(f'{key}{suffix}', default)
+
+    return fallback._replace(
+        ftp=FtpEndpoint(
+            env('FTP_HOST'), int(env('FTP_PORT', 21)), env('FTP_USER'), env('FTP_PASS'), env('FTP_FOLDER', '/')
+        ),
+        mode=env('MOVE_MODE', fallback.mode),
+        local_dir=env('LOCAL_DIR', '/tmp'),
+        mongo_uri=env('MONGO_URI'),
+        mongo_db=env('MONGO_DB', 'default_db'),
+        mongo_collection=env('MONGO_COLLECTION', 'default_collection'),
+        workers=int(env('FTP_WORKERS', fallback.workers)),
+        max_files_per_sec=float(env('FTP_MAX_FILES_PER_SEC', fallback.max_files_per_sec)),
+        max_bytes_per_sec=int(env('FTP_MAX_BYTES_PER_SEC', fallback.max_bytes_per_sec)),
+        snapshot=env('FTP_SNAPSHOT', '1' if fallback.snapshot else '0') == '1',
+        backend=env('TRANSFER_BACKEND', fallback.backend),
+        status_batch_size=int(env('STATUS_BATCH_SIZE', fallback.status_batch_size)),
+        status_flush_interval=float(env('STATUS_FLUSH_INTERVAL', fallback.status_flush_interval)),
+        spool_file=env('STATUS_SPOOL_FILE', f'status_spool{tag}.jsonl'),
+        checkpoint_file=env('CHECKPOINT_FILE', f'checkpoint{tag}.db'),
+        delete_workers=int(env('FTP_DELETE_WORKERS', fallback.delete_workers)),
+        pipeline_queue_size=int(env('PIPELINE_QUEUE_SIZE', fallback.pipeline_queue_size)),
+        dedup=env('DEDUP', '1' if fallback.dedup else '0') == '1',
+        dedup_index=env('DEDUP_INDEX_FILE', f'dedup{tag}.db'),
+        dedup_link=env('DEDUP_LINK', '1' if fallback.dedup_link else '0') == '1',
+        layout=env('LOCAL_LAYOUT', fallback.layout),
+        archive_index=env('ARCHIVE_INDEX_FILE', f'archive_index{tag}.db'),
+        segment_period=env('SEGMENT_PERIOD', fallback.segment_period),
+        segment_compress=env('SEGMENT_COMPRESS', fallback.segment_compress),
+        segment_max_bytes=int(env('SEGMENT_MAX_BYTES', fallback.segment_max_bytes)),
+        watermark_file=env('WATERMARK_FILE', f'watermark{tag}.json'),
+        watermark_lookback=float(env('WATERMARK_LOOKBACK', fallback.watermark_lookback)),
+        watermark_batch=int(env('WATERMARK_BATCH_SIZE', fallback.watermark_batch)),
+        watermark_max_attempts=int(env('WATERMARK_MAX_ATTEMPTS', fallback.watermark_max_attempts)),
+        stream_state_file=env('STREAM_STATE_FILE', f'stream_state{tag}.json'),
+        stream_method=env('STREAM_METHOD', fallback.stream_method),
+        stream_poll_interval=float(env('STREAM_POLL_INTERVAL', fallback.stream_poll_interval)),
+        idle_check=float(env('FTP_IDLE_CHECK', fallback.idle_check)),
+        delete_batch=int(env('FTP_DELETE_BATCH', fallback.delete_batch)),
+        run_cron=env('RUN_CRON', fallback.run_cron),
+        run_interval=float(env('RUN_INTERVAL_MINUTES', fallback.run_interval)),
+    )
+
+# Baca konfigurasi situs dari dict (file konfigurasi daemon).
+# Nilai string boleh memakai ${VAR} agar kredensial tetap di .env, atau
+# cukup tulis "env_suffix" untuk membaca variabel .env seperti '_HYLAB'.
+def site_from_dict(config):
+    config = {
+        key: os.path.expandvars(value) if isinstance(value, str) else value
+        for key, value in config.items()
+    }
+    if 'env_suffix' in config:
+        suffix = config.pop('env_suffix')
+        return site_from_env(config.pop('name'), suffix, **config)
+    ftp = {key: os.path.expandvars(str(value)) for key, value in config.pop('ftp').items()}
+    mongo = {key: os.path.expandvars(str(value)) for key, value in config.pop('mongo').items()}
+    name = config['name']
+    return Site(
+        ftp=FtpEndpoint(ftp['host'], int(ftp.get('port', 21)), ftp['user'], ftp['password'], ftp.get('folder', '/')),
+        mongo_uri=mongo['uri'],
+        mongo_db=mongo.get('db', 'default_db'),
+        mongo_collection=mongo.get('collection', 'default_collection'),
+        spool_file=config.pop('spool_file', f'status_spool_{name}.jsonl'),
+        checkpoint_file=config.pop('checkpoint_file', f'checkpoint_{name}.db'),
+        dedup_index=config.pop('dedup_index', f'dedup_{name}.db'),
+        archive_index=config.pop('archive_index', f'archive_index_{name}.db'),
+        watermark_file=config.pop('watermark_file', f'watermark_{name}.json'),
+        stream_state_file=config.pop('stream_state_file', f'stream_state_{name}.json'),
+        **config
+    )
+
+# Log dengan prefix nama situs agar log beberapa situs bisa dibedakan
+class SiteLog(logging.LoggerAdapter):
+    def process(self, msg, kwargs):
+        # Nama situs juga ikut sebagai field pada log JSON
+        kwargs['extra'] = {**self.extra, **kwargs.get('extra', {})}
+        return f"[{self.extra['site']}] {msg}", kwargs
+
+# Batas buffer memori per file pada mode segmen; file lebih besar ditampung di disk sementara
+SEGMENT_BUFFER_BYTES = 16 * 1024 * 1024
+
+# Field checksum untuk dokumen history
+def checksum_fields(checksum):
+    if checksum is None:
+        return {}
+    return {'checksum': checksum.hexdigest(), 'checksumAlgorithm': checksum.algorithm}
+
+# Koneksi ke FTP
+def connect_ftp(endpoint, log=logging):
+    try:
+        ftp = ftplib.FTP()
+        ftp.connect(endpoint.host, endpoint.port, timeout=30)  # Timeout 30 detik
+        ftp.login(endpoint.user, endpoint.password)
+        ftp.cwd(endpoint.folder)
+        ftp.set_pasv(True)  # Aktifkan mode pasif
+        log.info("Berhasil terhubung ke FTP.")
+        return ftp
+    except Exception as e:
+        log.error(f"Gagal terhubung ke FTP: {e}")
+        raise
+
+# Menjalankan pemindahan file untuk satu situs. Pool FTP dan MongoClient boleh
+# dipakai bersama beberapa situs yang berbagi server yang sama.
+# `warm=True` membiarkan sesi FTP tetap terbuka di antara run (lihat health_check).
+class SiteRunner:
+    def __init__(self, site, mongo_client=None, pool=None, warm=False):
+        self.site = site
+        self.warm = warm
+        self.log = SiteLog(logging.getLogger(), {'site': site.name})
+        self._own_client = mongo_client is None
+        self.mongo_client = mongo_client or MongoClient(site.mongo_uri)
+        self.collection = self.mongo_client[site.mongo_db][site.mongo_collection]
+        self.pool = pool or FtpPool(
+            partial(connect_ftp, site.ftp, self.log), site.workers, site.name, site.idle_check
+        )
+        # Koneksi kontrol terpisah untuk DELE agar tidak menunggu transfer data
+        self.delete_pool = FtpPool(
+            partial(connect_ftp, site.ftp, self.log), site.delete_workers, site.name, site.idle_check
+        )
+        self.limiter = RateLimiter(site.max_files_per_sec, site.max_bytes_per_sec)
+        self.watermark = Watermark(site.watermark_file)
+        self._running = threading.Lock()
+        self._index_ready = False
+        self._tail = None
+
+    # Query bawaan sesuai mode situs (atau `mode` pengganti)
+    def default_query(self, mode=None):
+        mode = mode or self.site.mode
+        if mode == 'all':
+            return unprocessed_query()
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        if mode == 'incremental':
+            # Mundur sedikit dari watermark untuk dokumen yang terlambat masuk;
+            # yang sudah diproses tersaring oleh process != true
+            start = self.watermark.get() or today
+            query = unprocessed_query(start - timedelta(seconds=self.site.watermark_lookback))
+            # Dokumen yang sudah terlalu sering gagal tidak mengisi batch lagi
+            excluded = self.watermark.excluded(self.site.watermark_max_attempts)
+            if excluded:
+                query['_id'] = {'$nin': excluded}
+            return query
+        return unprocessed_query(today, today + timedelta(days=1))
+
+    # Pindahkan semua file hasil `query`; run yang tumpang tindih ditolak
+    def run(self, query=None, mode=None):
+        if not self._running.acquire(blocking=False):
+            self.log.warning("Run sebelumnya masih berjalan. Run ini dilewati.")
+            return None
+        try:
+            incremental = query is None and (mode or self.site.mode) == 'incremental'
+            return self._run(query if query is not None else self.default_query(mode), incremental)
+        finally:
+            self._running.release()
+
+    # Mode streaming: pindahkan setiap dokumen baru begitu masuk ke koleksi
+    # history, sampai stop_stream() dipanggil atau proses dihentikan
+    def stream(self):
+        if not self._running.acquire(blocking=False):
+            self.log.warning("Run sebelumnya masih berjalan. Streaming tidak dimulai.")
+            return None
+        try:
+            self._tail = HistoryTail(
+                self.collection, self.site.stream_state_file, self.site.stream_method, self.site.stream_poll_interval
+            )
+            return self._run(None, source=self._tail, on_done=self._tail.done)
+        finally:
+            self._tail = None
+            self._running.release()
+
+    def stop_stream(self):
+        if self._tail is not None:
+            self._tail.stop()
+
+    # Jalankan rencana dari planner.py persis seperti saat dibuat: dokumen dan
+    # ukuran file diambil dari rencana, tanpa query dan snapshot MLSD baru
+    def run_plan(self, plan):
+        if not self._running.acquire(blocking=False):
+            self.log.warning("Run sebelumnya masih berjalan. Rencana tidak dijalankan.")
+            return None
+        try:
+            documents = plan.documents()
+            self.log.info(
+                f"Menjalankan rencana {plan.path} ({plan.header['selection']}, dibuat {plan.age()} yang lalu): "
+                f"{plan.files} file."
+            )
+            return self._run(None, source=documents, total_files=plan.files, snapshot=plan.snapshot())
+        finally:
+            self._running.release()
+
+    # `source` menggantikan query dengan aliran dokumen: rencana (`total_files`
+    # dan `snapshot` dari rencana) atau aliran tanpa akhir pada mode streaming,
+    # dengan `on_done(document)` dipanggil setiap dokumen selesai atau gagal
+    def _run(self, query, incremental=False, source=None, total_files=None, snapshot=None, on_done=None):
+        site, log, collection, limiter = self.site, self.log, self.collection, self.limiter
+        if not self._index_ready:
+            ensure_history_index(collection)
+            self._index_ready = True
+        status_writer = StatusWriter(
+            collection, site.spool_file, site.status_batch_size, site.status_flush_interval, site.name
+        )
+        checkpoint = Checkpoint(site.checkpoint_file)
+        dedup = DedupStore(site.local_dir, site.dedup_index, site.dedup_link) if site.dedup else None
+        archive = ArchiveLayout(site.local_dir, site.layout, site.archive_index)
+        segments = None
+        if site.segment_period:
+            segments = SegmentWriter(
+                site.local_dir, site.segment_period,
+                None if site.segment_compress == 'none' else site.segment_compress, site.segment_max_bytes
+            )
+        progress = None
+        try:
+            # Mode inkremental: urut createdAt dan dibatasi per batch agar run kecil dan sering
+            batch = site.watermark_batch if incremental else 0
+            if source is None:
+                log.info(f"Mengambil dokumen dari MongoDB dengan query {query}...")
+                check_query_plan(collection, query)
+                total_files = count_history(collection, query, batch)
+                log.info(f"Menemukan {total_files} file yang belum diproses.")
+
+                if total_files == 0:
+                    log.info("Tidak ada file untuk diproses. Proses selesai.")
+                    return {'ok': 0, 'failed': 0}
+
+            progress = ProgressReporter(log, total_files).start()
+            # Durasi tiap tahap per file untuk satu record ringkasan saat file selesai
+            timings = {}
+            # Checksum yang dihitung saat unduh, dibandingkan dengan server sebelum DELE
+            checksums = {}
+            # Mode segmen: nama file -> (path segmen, entri indeks)
+            archived = {}
+
+            # Lokasi file di arsip lokal sesuai layout situs
+            def local_path_of(document):
+                return archive.path_for(document['value'], document.get('createdAt'))
+
+            # Tahap per file, dipakai pipeline maupun worker sekuensial.
+            # Setiap item adalah (idx, document).
+            def download(ftp, item):
+                idx, document = item
+                file_name = document['value']
+
+                log.debug(f"[{idx}/{total_files or '?'}] Memproses file: {file_name}")
+                # Cek koneksi FTP yang sudah lama menganggur; jika terputus worker membuat sesi baru
+                if site.noop_check:
+                    check_alive(ftp, site.idle_check)
+                if segments is not None:
+                    return download_to_segment(ftp, document)
+
+                local_path = local_path_of(document)
+
+                # Unduh file dari FTP, kecuali sudah selesai diunduh pada run sebelumnya
+                state = checkpoint.state(file_name)
+                if state.get('downloaded') and os.path.exists(local_path):
+                    log.debug(f"File {file_name} sudah diunduh sebelumnya, melewati unduhan.")
+                    timings[file_name] = {'bytes': 0, 'resumed': True}
+                    checksum = new_checksum(ftp)
+                    if checksum is not None:
+                        checksums[file_name] = checksum.update_from_file(local_path)
+                    return
+                # Ukuran dari snapshot MLSD menghemat SIZE dan dipakai untuk pra-alokasi
+                entry = snapshot.get(file_name) if snapshot is not None else None
+                if dedup is not None and reuse_blob(ftp, document, entry, local_path):
+                    return
+                log.debug(f"Mengunduh file {file_name} dari FTP...")
+                checksum = new_checksum(ftp)
+                started = time.perf_counter()
+                with track_phase(site.name, 'retr'):
+                    received = download_file(
+                        ftp, file_name, local_path, limiter.throttled,
+                        size=entry.size if entry else None, checksum=checksum
+                    )
+                if checksum is not None:
+                    checksums[file_name] = checksum
+                timings[file_name] = {'bytes': received, 'retr_ms': round((time.perf_counter() - started) * 1000, 1)}
+                BYTES_MOVED.labels(site.name).inc(received)
+                checkpoint.mark(file_name, 'downloaded')
+                log.debug(f"File {file_name} berhasil diunduh ke {local_path}.")
+
+            # Mode segmen: unduh ke buffer (memori, pindah ke disk jika besar) lalu
+            # tulis sebagai satu member segmen tar, tanpa file terpisah per gambar
+            def download_to_segment(ftp, document):
+                file_name = document['value']
+                entry = snapshot.get(file_name) if snapshot is not None else None
+                checksum = new_checksum(ftp)
+                started = time.perf_counter()
+                with tempfile.SpooledTemporaryFile(max_size=SEGMENT_BUFFER_BYTES) as buffer:
+                    with track_phase(site.name, 'retr'):
+                        received = download_stream(
+                            ftp, file_name, buffer, limiter.throttled, size=entry.size if entry else None,
+                            checksum=checksum
+                        )
+                    buffer.seek(0)
+                    archived[file_name] = segments.append(
+                        file_name, buffer, received, checksum, document.get('createdAt')
+                    )
+                if checksum is not None:
+                    checksums[file_name] = checksum
+                timings[file_name] = {'bytes': received, 'retr_ms': round((time.perf_counter() - started) * 1000, 1)}
+                BYTES_MOVED.labels(site.name).inc(received)
+                checkpoint.mark(file_name, 'downloaded')
+
+            # Nama yang pernah dipindahkan (diunggah ulang) dengan ukuran sama seperti
+            # blob terakhirnya di indeks dedup tidak diunduh ulang, asalkan server
+            # memastikan isinya sama lewat HASH. Salinan kerja dibuat dari blob agar
+            # tahap verifikasi dan DELE tetap berjalan seperti biasa.
+            def reuse_blob(ftp, document, entry, local_path):
+                file_name = document['value']
+                known = dedup.latest(file_name)
+                if known is None or not os.path.exists(known[3]):
+                    return False
+                algorithm, digest, blob_size, blob = known
+                size = entry.size if entry else None
+                if size is None:
+                    try:
+                        size = ftp.size(file_name)
+                    except ftplib.error_perm:
+                        return False
+                if size != blob_size:
+                    return False
+                remote = remote_checksum(ftp, file_name, algorithm)
+                if remote is None or remote[0] != algorithm or int(remote[1], 16) != int(digest, 16):
+                    return False
+                dedup.materialize(blob, local_path)
+                checksums[file_name] = KnownChecksum(algorithm, digest, size)
+                timings[file_name] = {'bytes': 0, 'deduplicated': True}
+                checkpoint.mark(file_name, 'downloaded')
+                log.debug(f"Isi {file_name} sudah ada di blob {blob}, melewati unduhan.")
+                return True
+
+            # Pastikan salinan lokal lengkap sebelum file di FTP dihapus
+            def verify(item):
+                _, document = item
+                file_name = document['value']
+                entry = snapshot.get(file_name) if snapshot is not None else None
+                if segments is not None:
+                    if file_name not in archived:
+                        raise FileNotFoundError(f"{file_name} tidak ada di segmen arsip")
+                    size = archived[file_name][1]['size']
+                    if entry is not None and entry.size is not None and size != entry.size:
+                        raise ValueError(f"Ukuran {file_name} tidak cocok: segmen {size}, FTP {entry.size}")
+                    return
+                local_path = local_path_of(document)
+                if not os.path.exists(local_path):
+                    raise FileNotFoundError(f"Salinan lokal {local_path} tidak ditemukan")
+                if entry is not None and entry.size is not None and os.path.getsize(local_path) != entry.size:
+                    raise ValueError(
+                        f"Ukuran {file_name} tidak cocok: lokal {os.path.getsize(local_path)}, FTP {entry.size}"
+                    )
+                checksum = checksums.get(file_name)
+                if checksum is not None and checksum.size != os.path.getsize(local_path):
+                    raise ValueError(f"Salinan lokal {file_name} berubah setelah diunduh")
+
+            # DELE hanya setelah ukuran dan checksum server (HASH/XCRC, jika ada) cocok
+            def verify_remote(ftp, item):
+                _, document = item
+                file_name = document['value']
+                entry = snapshot.get(file_name) if snapshot is not None else None
+                if segments is not None:
+                    verify_download(
+                        ftp, file_name, None, checksums.get(file_name), entry.size if entry else None,
+                        local_size=archived[file_name][1]['size']
+                    )
+                else:
+                    verify_download(
+                        ftp, file_name, local_path_of(document), checksums.get(file_name),
+                        entry.size if entry else None
+                    )
+
+            # Worker sekuensial: verifikasi lalu DELE pada sesi yang sama
+            def delete(ftp, item):
+                file_name = item[1]['value']
+                verify_remote(ftp, item)
+                status_writer.sync()
+                log.debug(f"Menghapus file {file_name} dari FTP...")
+                started = time.perf_counter()
+                with track_phase(site.name, 'dele'):
+                    ftp.delete(file_name)
+                timings.setdefault(file_name, {})['dele_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                checkpoint.mark(file_name, 'deleted')
+                log.debug(f"File {file_name} berhasil dihapus dari FTP.")
+
+            # Pipeline: DELE tertunda dikuras per batch oleh sesi kontrol khusus.
+            # Setiap file diverifikasi dulu, lalu semua DELE dikirim sekaligus.
+            def delete_batch(ftp, items):
+                results = {}
+                ready = []
+                for item in items:
+                    file_name = item[1]['value']
+                    # Sudah terhapus sebelum koneksi putus pada percobaan sebelumnya
+                    if checkpoint.state(file_name).get('deleted'):
+                        results[file_name] = True
+                        continue
+                    try:
+                        verify_remote(ftp, item)
+                        ready.append(file_name)
+                    except Exception as e:
+                        if is_connection_error(e):
+                            raise
+                        log.error(f"Gagal memproses file {file_name}: {e}")
+                        results[file_name] = False
+                # Status file dari batch sebelumnya harus sudah di disk sebelum DELE berikutnya
+                status_writer.sync()
+                started = time.perf_counter()
+                with track_phase(site.name, 'dele'):
+                    failed = delete_files(ftp, ready, on_deleted=lambda name: checkpoint.mark(name, 'deleted'))
+                elapsed = round((time.perf_counter() - started) * 1000 / max(len(ready), 1), 1)
+                for file_name in ready:
+                    if file_name in failed:
+                        log.error(f"Gagal menghapus {file_name} dari FTP: {failed[file_name]}")
+                    else:
+                        timings.setdefault(file_name, {})['dele_ms'] = elapsed
+                    results[file_name] = file_name not in failed
+                return [results[item[1]['value']] for item in items]
+
+            # Antrekan pembaruan status dokumen, dikirim ke MongoDB per batch
+            def record(item):
+                idx, document = item
+                file_name = document['value']
+                checksum = checksums.pop(file_name, None)
+                fields = checksum_fields(checksum)
+                if segments is not None:
+                    fields['segment'] = os.path.basename(archived.pop(file_name)[0])
+                elif archive_file(document, checksum):
+                    timings.setdefault(file_name, {})['duplicate'] = True
+                status_writer.mark_processed(document["_id"], **fields)
+                if tracker is not None:
+                    tracker.finished(document)
+                checkpoint.finish(file_name)
+                FILES_MOVED.labels(site.name).inc()
+                summarize(file_name, idx)
+
+            # Simpan salinan lokal ke store dedup (jika aktif) dan catat lokasinya
+            # di indeks arsip. True jika isinya duplikat blob yang sudah ada.
+            def archive_file(document, checksum):
+                file_name = document['value']
+                local_path = local_path_of(document)
+                duplicate = False
+                if dedup is not None and checksum is not None:
+                    duplicate = dedup.add(file_name, local_path, checksum)
+                # Tanpa dedup salinan selalu ada di local_path
+                if os.path.exists(local_path) or dedup is None:
+                    archive.record(file_name, local_path)
+                else:
+                    archive.record(file_name, dedup.lookup(file_name))
+                return duplicate
+
+            # File selesai pada backend asyncio (unduh dan DELE sudah dilakukan worker)
+            def moved_async(document, checksum):
+                archive_file(document, checksum)
+                status_writer.mark_processed(document["_id"], **checksum_fields(checksum))
+                # Worker asyncio mengirim DELE per file; spool di-fsync sebelum DELE berikutnya
+                status_writer.sync()
+                if tracker is not None:
+                    tracker.finished(document)
+                progress.add()
+
+            # Satu record ringkasan per file menggantikan log per tahap
+            def summarize(file_name, idx=None):
+                timing = timings.pop(file_name, {})
+                progress.add(timing.get('bytes', 0))
+                position = f"[{idx}/{total_files or '?'}] " if idx is not None else ''
+                log.info(
+                    f"{position}{file_name} dipindahkan: {timing.get('bytes', 0)} byte, "
+                    f"RETR {timing.get('retr_ms', '-')} ms, DELE {timing.get('dele_ms', '-')} ms",
+                    extra={'file': file_name, **timing}
+                )
+
+            # Bungkus tahap: error koneksi dilempar agar sesi dibuat ulang,
+            # error lain dicatat dan item berhenti di tahap ini
+            def guarded(step, uses_ftp=True, throttled=False):
+                def run_step(*args):
+                    item = args[-1]
+                    try:
+                        if throttled:
+                            limiter.acquire()
+                        step(*args)
+                        if throttled:
+                            limiter.on_success()
+                    except Exception as e:
+                        if throttled:
+                            limiter.on_error(e)
+                        if uses_ftp and is_connection_error(e):
+                            raise
+                        log.error(f"Gagal memproses file {item[1].get('value')}: {e}")
+                        return False
+                return run_step
+
+            # Worker sekuensial: semua tahap berurutan pada satu sesi
+            def move_file(ftp, item):
+                try:
+                    download(ftp, item)
+                    verify(item)
+                    delete(ftp, item)
+                    record(item)
+                except Exception as e:
+                    if is_connection_error(e):
+                        raise
+                    limiter.on_error(e)
+                    log.error(f"Gagal memproses file {item[1].get('value')}: {e}")
+                    return False
+
+            # Dokumen yang sudah tuntas pada run yang terputus (lihat checkpoint.pending)
+            def resumed(document):
+                status_writer.mark_processed(document["_id"])
+                if on_done is not None:
+                    on_done(document)
+
+            # Item keluar dari pipeline/worker (berhasil atau gagal): posisi streaming boleh maju
+            def done(item, ok):
+                on_done(item[1])
+
+            tracker = WatermarkTracker() if incremental else None
+            if source is not None:
+                documents = iter(source)
+            elif incremental:
+                documents = tracker.seen(iter_history(collection, query, sort=[('createdAt', 1)], limit=batch))
+            else:
+                documents = iter_history(collection, query)
+            # File yang sudah dihapus dari FTP pada run yang terputus cukup diperbarui statusnya
+            documents = checkpoint.pending(documents, key=lambda document: document.get('value'), on_finished=resumed)
+            # Satu snapshot MLSD untuk melewati nama yang sudah tidak ada di FTP.
+            # Tidak dipakai pada mode streaming (file baru belum ada di snapshot)
+            # maupun rencana (sudah disaring saat rencana dibuat).
+            if site.snapshot and source is None:
+                try:
+                    snapshot = snapshot_from_pool(self.pool)
+                    documents = snapshot.existing(
+                        documents, key=lambda document: document.get('value'),
+                        on_skipped=tracker.skipped if tracker is not None else None
+                    )
+                except Exception as e:
+                    log.warning(f"Gagal mengambil snapshot FTP, semua dokumen diproses: {e}")
+            if tracker is not None:
+                documents = tracker.started(documents)
+
+            # Alirkan dokumen dari cursor ke worker secara paralel
+            backend = site.backend
+            if backend == 'asyncio' and segments is not None:
+                log.warning("Mode segmen belum didukung backend asyncio, memakai backend pipeline.")
+                backend = 'pipeline'
+            if backend == 'asyncio' and on_done is not None:
+                log.warning("Mode streaming belum didukung backend asyncio, memakai backend pipeline.")
+                backend = 'pipeline'
+            if backend == 'asyncio':
+                stats = asyncio.run(run_async_transfers(
+                    site.ftp, documents, site.local_dir, site.workers,
+                    name_of=lambda document: document['value'],
+                    on_moved=moved_async,
+                    limiter=limiter, checkpoint=checkpoint, name=site.name, path_of=local_path_of
+                ))
+            elif backend == 'pipeline':
+                stats = run_pipeline([
+                    Stage('unduh', guarded(download, throttled=True), site.workers, self.pool),
+                    Stage('verifikasi', guarded(verify, uses_ftp=False)),
+                    Stage('hapus', delete_batch, site.delete_workers, self.delete_pool, site.delete_batch),
+                    Stage('status', guarded(record, uses_ftp=False)),
+                ], enumerate(documents, start=1), site.pipeline_queue_size, site.name,
+                    on_done=done if on_done is not None else None)
+                if not self.warm:
+                    self.delete_pool.close()
+            else:
+                stats = run_transfers(
+                    self.pool, enumerate(documents, start=1), move_file, site.workers, limiter,
+                    on_done=done if on_done is not None else None
+                )
+
+            if tracker is not None:
+                mark = tracker.next_mark(
+                    self.watermark.failures(), site.watermark_max_attempts, site.watermark_lookback
+                )
+                if mark is not None:
+                    self.watermark.save(*mark)
+                    log.info(f"Watermark diperbarui ke {mark[0].isoformat()}.")
+
+            if self.warm:
+                log.info("Proses selesai. Koneksi FTP tetap terbuka untuk run berikutnya.")
+            else:
+                self.pool.close()
+                log.info("Koneksi ke FTP ditutup. Proses selesai.")
+            return stats
+        finally:
+            if progress is not None:
+                progress.stop()
+            # Flush terakhir, termasuk saat proses dihentikan oleh sinyal
+            status_writer.close()
+            checkpoint.close()
+            if dedup is not None:
+                dedup.close()
+            archive.close()
+            if segments is not None:
+                segments.close()
+
+    # Cek kesehatan koneksi di antara run: ping MongoDB dan NOOP ke sesi FTP
+    # yang menganggur. Dilewati jika run sedang berjalan.
+    def health_check(self, max_idle=0):
+        if self._running.locked():
+            return
+        try:
+            self.mongo_client.admin.command('ping')
+        except PyMongoError as e:
+            self.log.warning(f"MongoDB tidak merespons ping: {e}")
+        healthy = self.pool.keepalive(max_idle) + self.delete_pool.keepalive(max_idle)
+        self.log.debug(f"Health check selesai, {healthy} sesi FTP menganggur sehat.")
+
+    def close(self):
+        self.pool.close()
+        self.delete_pool.close()
+        if self._own_client:
+            self.mongo_client.close()
@@ -0,0 +1,153 @@
+import logging
+import os
+import queue
+import threading
+from collections import namedtuple
+from transfer import DEFAULT_DELETE_BATCH, acquire_session, delete_files, is_connection_error, touch
+from metrics import QUEUE_DEPTH
+
+# Satu tahap pipeline. `fn(ftp, item)` jika tahap memakai sesi dari `pool`,
+# atau `fn(item)` jika pool None. fn mengembalikan False untuk menghentikan
+# item di tahap ini; selain itu item diteruskan ke tahap berikutnya.
+# `batch` diisi (termasuk 1): fn menerima list item yang sudah mengantre
+# (paling banyak `batch`, tanpa menunggu item baru) dan mengembalikan hasil per item.
+Stage = namedtuple('Stage', ['name', 'fn', 'workers', 'pool', 'batch'], defaults=(1, None, None))
+
+# Penanda akhir antrean untuk worker
+_STOP = object()
+
+# Ambil item berikutnya ditambah item lain yang sudah mengantre sampai `size`.
+# Mengembalikan (items, stop); stop True jika penanda akhir ikut terambil.
+def _take(inbox, size):
+    item = inbox.get()
+    if item is _STOP:
+        return [], True
+    items = [item]
+    while len(items) < size:
+        try:
+            item = inbox.get_nowait()
+        except queue.Empty:
+            break
+        if item is _STOP:
+            return items, True
+        items.append(item)
+    return items, False
+
+def _stage_worker(stage, inbox, outbox, stats, lock, name, on_done):
+    ftp = None
+    stop = False
+    while not stop:
+        items, stop = _take(inbox, stage.batch or 1)
+        if not items:
+            break
+        QUEUE_DEPTH.labels(name, stage.name).set(inbox.qsize())
+        results = [False] * len(items)
+        # Tahap dengan sesi FTP: satu kali ulang dengan sesi baru jika sesi lama mati
+        for _ in range(2 if stage.pool is not None else 1):
+            if stage.pool is not None and ftp is None:
+                ftp = acquire_session(stage.pool)
+                if ftp is None:
+                    break
+            try:
+                args = (ftp,) if stage.pool is not None else ()
+                if stage.batch is not None:
+                    results = [result is not False for result in stage.fn(*args, items)]
+                else:
+                    results = [stage.fn(*args, items[0]) is not False]
+                break
+            except Exception as e:
+                if stage.pool is None or not is_connection_error(e):
+                    logging.error(f"Tahap {stage.name} gagal untuk item {items if stage.batch is not None else items[0]}: {e}")
+                    break
+                logging.warning(f"Koneksi FTP tahap {stage.name} terputus ({e}). Membuat ulang sesi...")
+                stage.pool.discard(ftp)
+                ftp = None
+        if ftp is not None:
+            touch(ftp)
+        for item, passed in zip(items, results):
+            if passed and outbox is not None:
+                outbox.put(item)
+            elif on_done is not None:
+                on_done(item, passed)
+            with lock:
+                stats[stage.name if passed else f'{stage.name}_failed'] += 1
+    if ftp is not None:
+        stage.pool.release(ftp)
+
+# Jalankan item melewati beberapa tahap yang dihubungkan antrean terbatas.
+# Setiap tahap punya worker sendiri sehingga jaringan, disk, dan MongoDB bekerja
+# bersamaan; antrean yang penuh menahan tahap sebelumnya (backpressure).
+# `name` menjadi label metrik kedalaman antrean. `on_done(item, ok)` dipanggil
+# setiap item keluar dari pipeline, baik selesai maupun berhenti di suatu tahap.
+def run_pipeline(stages, items, queue_size=64, name='default', on_done=None):
+    inboxes = [queue.Queue(maxsize=queue_size) for _ in stages]
+    stats = {}
+    for stage in stages:
+        stats[stage.name] = 0
+        stats[f'{stage.name}_failed'] = 0
+    lock = threading.Lock()
+
+    threads = []
+    for index, stage in enumerate(stages):
+        outbox = inboxes[index + 1] if index + 1 < len(stages) else None
+        threads.append([
+            threading.Thread(target=_stage_worker, args=(stage, inboxes[index], outbox, stats, lock, name, on_done), daemon=True)
+            for _ in range(stage.workers)
+        ])
+    for stage_threads in threads:
+        for thread in stage_threads:
+            thread.start()
+
+    try:
+        for item in items:
+            inboxes[0].put(item)
+    finally:
+        # Tutup tahap satu per satu: tahap berikutnya berhenti setelah tahap sebelumnya selesai
+        for index, stage in enumerate(stages):
+            for _ in range(stage.workers):
+                inboxes[index].put(_STOP)
+            for thread in threads[index]:
+                thread.join()
+
+    summary = ', '.join(f"{stage.name}: {stats[stage.name]} ok/{stats[f'{stage.name}_failed']} gagal" for stage in stages)
+    logging.info(f"Pipeline selesai ({summary}).")
+    stats['ok'] = stats[stages[-1].name]
+    stats['failed'] = sum(stats[f'{stage.name}_failed'] for stage in stages)
+    return stats
+
+# Antrean DELE tertunda yang dikuras oleh satu sesi kontrol khusus dari `pool`,
+# sehingga unduhan tidak menunggu DELE. DELE yang sudah mengantre dikirim
+# sekaligus (lihat delete_files). `on_done(file_name, ok)` dipanggil dari
+# thread penguras setelah balasan server diterima.
+class DeleteQueue:
+    def __init__(self, pool, on_done=None, batch=None, queue_size=256, name='default'):
+        self.on_done = on_done
+        self._items = queue.Queue(maxsize=queue_size)
+        # File yang sudah terhapus pada percobaan sebelum koneksi putus
+        self._deleted = set()
+        batch = batch or int(os.getenv('FTP_DELETE_BATCH', DEFAULT_DELETE_BATCH))
+        self._thread = threading.Thread(
+            target=run_pipeline,
+            args=([Stage('hapus', self._delete, 1, pool, batch)], iter(self._items.get, _STOP), queue_size, name),
+            kwargs={'on_done': self._finished}, daemon=True
+        )
+        self._thread.start()
+
+    def _delete(self, ftp, names):
+        failed = delete_files(ftp, [name for name in names if name not in self._deleted], self._deleted.add)
+        for name, error in failed.items():
+            logging.error(f"Gagal menghapus {name} dari FTP: {error}")
+        return [name not in failed for name in names]
+
+    def _finished(self, name, ok):
+        self._deleted.discard(name)
+        if self.on_done is not None:
+            self.on_done(name, ok)
+
+    def submit(self, file_name):
+        self._items.put(file_name)
+
+    # Tunggu semua DELE yang tertunda selesai
+    def close(self):
+        self._items.put(_STOP)
+        self._thread.join()
@@ -0,0 +1,319 @@
+import argparse
+import heapq
+import logging
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timedelta
+from bson import json_util
+from ftp_listing import FtpSnapshot, ListingEntry, parse_day, take_snapshot
+from mongo_utils import DEFAULT_BATCH_SIZE, iter_history
+from transfer import download_stream
+
+# Jenis rencana: 'db' = dari query MongoDB (index.py, move_all.py, move_daily.py),
+# 'ftp' = dari pilihan snapshot FTP (main.py)
+PLAN_KINDS = ('db', 'ftp')
+
+# Pilihan rencana 'db' yang mencakup semua dokumen belum diproses (move_all.py, index.py)
+ALL_SELECTIONS = ('mode=all', 'reconcile')
+
+# Jumlah file terbesar yang diunduh (tanpa disimpan) untuk mengukur throughput
+PROBE_SAMPLES = 3
+
+# Jumlah contoh nama yang ditampilkan untuk setiap sisi yang tidak cocok
+SHOW_MISSING = 10
+
+# Tujuan tulis yang membuang data, untuk mengukur throughput tanpa menyimpan file
+class _Discard:
+    def write(self, data):
+        pass
+
+# Ukur waktu bolak-balik koneksi kontrol (NOOP) dan throughput satu koneksi
+# data dengan mengunduh beberapa file tanpa menyimpan atau menghapusnya.
+# Overhead per file diperkirakan 3 kali bolak-balik (PASV, RETR, DELE).
+def measure_throughput(ftp, entries, samples=PROBE_SAMPLES):
+    rtts = []
+    for _ in range(3):
+        started = time.perf_counter()
+        ftp.voidcmd('NOOP')
+        rtts.append(time.perf_counter() - started)
+    rtt = min(rtts)
+    received = elapsed = 0
+    for entry in entries[:samples]:
+        started = time.perf_counter()
+        received += download_stream(ftp, entry.name, _Discard(), size=entry.size)
+        elapsed += time.perf_counter() - started
+    # Waktu transfer bersih: kurangi bolak-balik PASV dan RETR setiap sampel
+    transfer_time = max(elapsed - 2 * rtt * min(samples, len(entries)), 1e-6)
+    return {
+        'rtt_ms': round(rtt * 1000, 2),
+        'per_file_s': 3 * rtt,
+        'bytes_per_sec': received / transfer_time if received else None,
+    }
+
+# Perkiraan durasi (detik) untuk `files` file berukuran total `size` byte
+# dengan `workers` koneksi paralel, dibatasi rate limit situs jika ada
+def estimate_seconds(files, size, throughput, workers, max_files_per_sec=0, max_bytes_per_sec=0):
+    seconds = files * throughput['per_file_s']
+    if throughput.get('bytes_per_sec'):
+        seconds += size / throughput['bytes_per_sec']
+    seconds /= max(workers, 1)
+    if max_files_per_sec:
+        seconds = max(seconds, files / max_files_per_sec)
+    if max_bytes_per_sec:
+        seconds = max(seconds, size / max_bytes_per_sec)
+    return seconds
+
+# Penulis file rencana (JSON lines): baris pertama header ringkasan, lalu satu
+# baris per file ({"name", "size", ...}) atau per nama yang tidak cocok
+# ({"name", "missing": "ftp"|"mongo"}). Item ditulis ke file sementara lebih
+# dulu karena header baru lengkap setelah seluruh pilihan dibaca.
+class PlanWriter:
+    def __init__(self, path, kind, selection):
+        if kind not in PLAN_KINDS:
+            raise ValueError(f"Jenis rencana tidak dikenal: {kind}")
+        self.path = os.path.abspath(path)
+        self.header = {
+            'kind': kind, 'selection': selection, 'created_at': datetime.utcnow(),
+            'files': 0, 'bytes': 0, 'unknown_size': 0, 'missing_on_ftp': 0, 'missing_in_mongo': 0,
+        }
+        self.examples = {'ftp': [], 'mongo': []}
+        self._largest = []
+        self._items = open(self.path + '.items', 'w')
+
+    def add(self, name, size, document=None):
+        item = {'name': name, 'size': size}
+        if document is not None:
+            item.update(_id=document['_id'], createdAt=document.get('createdAt'))
+        self._items.write(json_util.dumps(item) + '\n')
+        self.header['files'] += 1
+        if size is None:
+            self.header['unknown_size'] += 1
+            return
+        self.header['bytes'] += size
+        # Simpan beberapa file terbesar sebagai sampel pengukuran throughput
+        if len(self._largest) < PROBE_SAMPLES:
+            heapq.heappush(self._largest, (size, name))
+        elif size > self._largest[0][0]:
+            heapq.heapreplace(self._largest, (size, name))
+
+    # Nama yang ada di satu sisi saja: 'ftp' = dokumen tanpa file di FTP,
+    # 'mongo' = file FTP tanpa dokumen di MongoDB
+    def missing(self, name, side):
+        self._items.write(json_util.dumps({'name': name, 'missing': side}) + '\n')
+        self.header['missing_on_ftp' if side == 'ftp' else 'missing_in_mongo'] += 1
+        if len(self.examples[side]) < SHOW_MISSING:
+            self.examples[side].append(name)
+
+    # File terbesar dalam rencana, untuk measure_throughput
+    def samples(self):
+        return [ListingEntry(name, size, None, parse_day(name)) for size, name in sorted(self._largest, reverse=True)]
+
+    # Tulis header (dengan perkiraan durasi jika `throughput` ada) lalu item ke `path`
+    def finish(self, throughput=None, workers=1, max_files_per_sec=0, max_bytes_per_sec=0):
+        self._items.close()
+        if throughput is not None:
+            self.header['estimate'] = {
+                **throughput, 'workers': workers,
+                'seconds': round(estimate_seconds(
+                    self.header['files'], self.header['bytes'], throughput, workers, max_files_per_sec, max_bytes_per_sec
+                ), 1),
+            }
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as target, open(self.path + '.items') as items:
+            target.write(json_util.dumps(self.header) + '\n')
+            shutil.copyfileobj(items, target)
+        os.replace(temp_path, self.path)
+        os.remove(self.path + '.items')
+        return self.header
+
+# Rencana yang sudah disimpan. Item dibaca ulang dari file setiap kali
+# diiterasi sehingga rencana besar tidak perlu dimuat ke memori.
+class Plan:
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        with open(self.path) as source:
+            self.header = json_util.loads(source.readline())
+        self.kind = self.header['kind']
+        self.files = self.header['files']
+
+    # Tolak rencana yang dibuat untuk skrip lain: jenis harus `kind` dan, jika
+    # `selections` diberikan, pilihannya salah satu dari itu
+    def require(self, kind, selections=None):
+        if self.kind != kind:
+            raise ValueError(f"Rencana {self.path} berjenis {self.kind}, skrip ini butuh rencana {kind}")
+        if selections is not None and self.header['selection'] not in selections:
+            raise ValueError(
+                f"Rencana {self.path} ({self.header['selection']}) bukan untuk skrip ini; "
+                f"yang diterima: {', '.join(selections)}"
+            )
+        return self
+
+    def _records(self):
+        with open(self.path) as source:
+            source.readline()
+            for line in source:
+                yield json_util.loads(line)
+
+    # Item yang akan dipindahkan (tanpa nama yang tidak cocok)
+    def __iter__(self):
+        return (record for record in self._records() if 'missing' not in record)
+
+    def missing(self, side):
+        return (record['name'] for record in self._records() if record.get('missing') == side)
+
+    def entries(self):
+        return (ListingEntry(item['name'], item['size'], None, parse_day(item['name'])) for item in self)
+
+    # Pengganti snapshot MLSD: ukuran file dari saat rencana dibuat
+    def snapshot(self):
+        return FtpSnapshot(list(self.entries()))
+
+    # Dokumen history untuk mover (hanya rencana 'db')
+    def documents(self):
+        if self.kind != 'db':
+            raise ValueError(f"Rencana {self.path} bukan rencana MongoDB (jenis {self.kind})")
+        return ({'_id': item['_id'], 'value': item['name'], 'createdAt': item.get('createdAt')} for item in self)
+
+    # Umur rencana (dibulatkan ke detik)
+    def age(self):
+        return timedelta(seconds=int((datetime.utcnow() - self.header['created_at']).total_seconds()))
+
+# Rencana dari query MongoDB: dokumen yang file-nya tidak ada di snapshot FTP
+# dicatat sebagai missing 'ftp'. `ftp_scope` (entri snapshot yang seharusnya
+# punya dokumen) opsional; yang tidak dirujuk dokumen dicatat sebagai missing 'mongo'.
+def plan_from_query(writer, collection, query, snapshot, ftp_scope=None):
+    matched = set()
+    for document in iter_history(collection, query):
+        name = document.get('value')
+        if not name:
+            continue
+        entry = snapshot.get(name)
+        if entry is None:
+            writer.missing(name, 'ftp')
+            continue
+        matched.add(name)
+        writer.add(name, entry.size, document)
+    for entry in ftp_scope or ():
+        if entry.name not in matched:
+            writer.missing(entry.name, 'mongo')
+    return writer
+
+# Rencana dari pilihan snapshot FTP. Jika `collection` diberikan, file tanpa
+# dokumen MongoDB (dalam rentang createdAt `window`, jika ada) dicatat sebagai missing 'mongo'.
+def plan_from_snapshot(writer, entries, collection=None, window=None):
+    known = None
+    if collection is not None:
+        wanted = {entry.name for entry in entries}
+        known = set()
+        query = {'createdAt': {'$gte': window[0], '$lt': window[1]}} if window else {}
+        for document in collection.find(query, {'value': 1}).batch_size(DEFAULT_BATCH_SIZE):
+            if document.get('value') in wanted:
+                known.add(document['value'])
+    for entry in entries:
+        writer.add(entry.name, entry.size)
+        if known is not None and entry.name not in known:
+            writer.missing(entry.name, 'mongo')
+    return writer
+
+# Pilihan file seperti main.py: (fungsi pilih dari snapshot, rentang createdAt untuk cek MongoDB)
+def ftp_selection(name, today=None):
+    today = (today or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    if name == 'yesterday':
+        yesterday = today - timedelta(days=1)
+        return (lambda snapshot: snapshot.on(yesterday)), (yesterday - timedelta(days=1), today + timedelta(days=1))
+    if name == 'last-month':
+        last_month = today.replace(day=1) - timedelta(days=1)
+        start = last_month.replace(day=1)
+        return (
+            (lambda snapshot: snapshot.month(last_month.year, last_month.month)),
+            (start - timedelta(days=1), today.replace(day=1) + timedelta(days=1)),
+        )
+    return (lambda snapshot: snapshot.all()), None
+
+def _duration(seconds):
+    return str(timedelta(seconds=int(seconds)))
+
+# Ringkasan rencana untuk ditampilkan di terminal
+def describe(header, examples=None):
+    lines = [
+        f"Rencana {header['kind']} ({header['selection']}), dibuat {header['created_at']:%Y-%m-%d %H:%M:%S} UTC",
+        f"File: {header['files']} ({header['bytes'] / 1e6:.1f} MB), ukuran tidak diketahui: {header['unknown_size']}",
+        f"Tidak ada di FTP: {header['missing_on_ftp']}",
+        f"Tidak ada di MongoDB: {header['missing_in_mongo']}",
+    ]
+    for side, label in (('ftp', 'Tidak ada di FTP'), ('mongo', 'Tidak ada di MongoDB')):
+        if examples and examples.get(side):
+            lines.append(f"  contoh {label.lower()}: {', '.join(examples[side])}")
+    estimate = header.get('estimate')
+    if estimate:
+        rate = estimate['bytes_per_sec']
+        lines.append(
+            f"Perkiraan durasi: {_duration(estimate['seconds'])} dengan {estimate['workers']} koneksi "
+            f"({rate / 1e6 if rate else 0:.2f} MB/s per koneksi, RTT {estimate['rtt_ms']} ms)"
+        )
+    return '\n'.join(lines)
+
+# Perintah: buat rencana dari MongoDB atau dari snapshot FTP, atau tampilkan rencana
+def main():
+    from dotenv import load_dotenv
+    from log_setup import setup_logging
+    from mover import SiteRunner, site_from_env
+
+    load_dotenv()
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Rencana pemindahan (dry run) housekeeping FTP")
+    commands = parser.add_subparsers(dest='command', required=True)
+    db = commands.add_parser('db', help="Rencana dari query MongoDB (index.py, move_all.py, move_daily.py)")
+    db.add_argument('--mode', choices=['all', 'daily'], default='all')
+    ftp = commands.add_parser('ftp', help="Rencana dari pilihan snapshot FTP (main.py)")
+    ftp.add_argument('--select', choices=['yesterday', 'last-month', 'all'], default='all')
+    ftp.add_argument('--with-mongo', action='store_true', help="Cek file FTP yang tidak punya dokumen MongoDB")
+    for command in (db, ftp):
+        command.add_argument('-o', '--output', default=os.getenv('PLAN_FILE', 'rencana.jsonl'))
+        command.add_argument(
+            '--probe', type=int, default=PROBE_SAMPLES, help="Jumlah file sampel throughput, 0 = tanpa perkiraan"
+        )
+    show = commands.add_parser('show', help="Tampilkan ringkasan rencana")
+    show.add_argument('plan')
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        plan = Plan(args.plan)
+        examples = {side: [name for _, name in zip(range(SHOW_MISSING), plan.missing(side))] for side in ('ftp', 'mongo')}
+        print(describe(plan.header, examples))
+        return
+
+    site = site_from_env('default', mode=getattr(args, 'mode', 'all'))
+    runner = SiteRunner(site)
+    session = None
+    try:
+        session = runner.pool.acquire()
+        snapshot = take_snapshot(session)
+        if args.command == 'db':
+            query = runner.default_query(args.mode)
+            writer = PlanWriter(args.output, 'db', f'mode={args.mode}')
+            # Mode all: semua file JPG di FTP seharusnya punya dokumen yang belum diproses
+            scope = snapshot.all() if args.mode == 'all' else snapshot.on(datetime.utcnow())
+            plan_from_query(writer, runner.collection, query, snapshot, scope)
+        else:
+            select, window = ftp_selection(args.select)
+            writer = PlanWriter(args.output, 'ftp', f'select={args.select}')
+            plan_from_snapshot(writer, select(snapshot), runner.collection if args.with_mongo else None, window)
+        throughput = None
+        if args.probe > 0 and writer.header['files']:
+            throughput = measure_throughput(session, writer.samples(), args.probe)
+        header = writer.finish(throughput, site.workers, site.max_files_per_sec, site.max_bytes_per_sec)
+        print(describe(header, writer.examples))
+        print(f"Rencana disimpan di {writer.path}")
+    except Exception as e:
+        logging.error(f"Gagal membuat rencana: {e}")
+        sys.exit(1)
+    finally:
+        if session is not None:
+            runner.pool.release(session)
+        runner.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import ftplib
+import logging
+import socket
+import threading
+import time
+from collections import deque
+
+# Laju teramati dihitung dari file yang selesai dalam jendela ini (detik)
+OBSERVED_WINDOW = 10.0
+
+# Cek apakah error menandakan server FTP kewalahan (421/4xx atau timeout)
+def is_throttle_error(e):
+    return isinstance(e, (ftplib.error_temp, TimeoutError, socket.timeout))
+
+# Token bucket dengan AIMD: laju turun setengah saat server kewalahan,
+# lalu naik perlahan (aditif) selama transfer kembali lancar.
+# Nilai 0 pada files_per_sec / bytes_per_sec berarti tanpa batas; saat server
+# kewalahan, batas file diambil dari laju teramati lalu diturunkan dari sana,
+# dan dilepas lagi setelah laju pulih penuh.
+class RateLimiter:
+    def __init__(self, files_per_sec=0, bytes_per_sec=0, min_factor=0.05,
+                 increase_per_sec=0.05, backoff_factor=0.5, backoff_cooldown=1.0):
+        self.files_per_sec = files_per_sec
+        self.bytes_per_sec = bytes_per_sec
+        self.min_factor = min_factor
+        self.increase_per_sec = increase_per_sec
+        self.backoff_factor = backoff_factor
+        self.backoff_cooldown = backoff_cooldown
+        self.factor = 1.0
+        self._lock = threading.Lock()
+        now = time.monotonic()
+        self._tokens = {'files': max(1, files_per_sec), 'bytes': bytes_per_sec}
+        self._last_refill = now
+        self._last_increase = now
+        self._last_backoff = 0.0
+        self._adaptive = False
+        self._finished = deque()
+
+    # Laju efektif saat ini (setelah dikalikan faktor AIMD)
+    def current_rate(self, kind):
+        limit = self.files_per_sec if kind == 'files' else self.bytes_per_sec
+        return limit * self.factor
+
+    # Isi ulang token sesuai waktu yang berlalu; kapasitas = jatah 1 detik
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        for kind, limit in (('files', self.files_per_sec), ('bytes', self.bytes_per_sec)):
+            if limit:
+                capacity = max(1, limit)
+                self._tokens[kind] = min(capacity, self._tokens[kind] + elapsed * limit * self.factor)
+
+    # Ambil token; mengembalikan lama tunggu (detik) sampai utangnya terbayar
+    def _reserve(self, kind, amount):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens[kind] -= amount
+            deficit = -self._tokens[kind]
+            rate = self.current_rate(kind)
+        return deficit / rate if deficit > 0 else 0
+
+    # Ambil token; jika kurang, tunggu sampai utangnya terbayar
+    def _take(self, kind, amount):
+        delay = self._reserve(kind, amount)
+        if delay:
+            time.sleep(delay)
+
+    # Tunggu giliran sebelum memproses satu file
+    def acquire(self):
+        if self.files_per_sec:
+            self._take('files', 1)
+
+    # Tunggu sampai `count` byte boleh ditransfer
+    def consume_bytes(self, count):
+        if self.bytes_per_sec:
+            self._take('bytes', count)
+
+    # Seperti consume_bytes tetapi tidak tidur: mengembalikan lama tunggu (detik)
+    # agar worker asyncio bisa menunggu dengan asyncio.sleep
+    def bytes_delay(self, count):
+        if not self.bytes_per_sec:
+            return 0
+        return self._reserve('bytes', count)
+
+    # Bungkus callback write agar setiap blok data ikut dibatasi laju byte
+    def throttled(self, write):
+        if not self.bytes_per_sec:
+            return write
+
+        def _write(data):
+            self.consume_bytes(len(data))
+            write(data)
+        return _write
+
+    # Laju file selesai per detik dalam OBSERVED_WINDOW terakhir (dipanggil dengan lock)
+    def _observed_rate(self, now):
+        while self._finished and now - self._finished[0] > OBSERVED_WINDOW:
+            self._finished.popleft()
+        if not self._finished:
+            return 0
+        return len(self._finished) / max(1.0, now - self._finished[0])
+
+    # Transfer berhasil: naikkan laju secara aditif sesuai waktu yang berlalu
+    def on_success(self):
+        with self._lock:
+            now = time.monotonic()
+            self._finished.append(now)
+            self._observed_rate(now)
+            if self.factor < 1.0:
+                self.factor = min(1.0, self.factor + self.increase_per_sec * (now - self._last_increase))
+                if self.factor == 1.0 and self._adaptive:
+                    # Laju sudah pulih; kembali tanpa batas
+                    self.files_per_sec = 0
+                    self._adaptive = False
+            self._last_increase = now
+
+    # Transfer gagal: turunkan laju jika error menandakan server kewalahan
+    def on_error(self, e):
+        if not is_throttle_error(e):
+            return False
+        with self._lock:
+            now = time.monotonic()
+            # Banyak worker bisa gagal bersamaan; cukup turunkan sekali per cooldown
+            if now - self._last_backoff < self.backoff_cooldown:
+                return True
+            self._refill(now)
+            if not self.files_per_sec:
+                # Tanpa batas yang dikonfigurasi: mulai dari laju yang teramati
+                self.files_per_sec = max(1.0, self._observed_rate(now))
+                self._tokens['files'] = min(self._tokens['files'], self.files_per_sec)
+                self._adaptive = True
+            self.factor = max(self.min_factor, self.factor * self.backoff_factor)
+            self._last_backoff = now
+            self._last_increase = now
+        logging.warning(
+            f"Server FTP kewalahan ({e}). Laju diturunkan ke {self.factor:.0%} dari batas "
+            f"({self.current_rate('files'):.1f} file/detik)."
+        )
+        return True
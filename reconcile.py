@@ -0,0 +1,159 @@
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+from ftp_listing import iter_listing, sorted_listing
+from mongo_utils import (
+    VALUE_INDEX, VALUE_INDEX_NAME, StatusWriter, ensure_history_index, iter_history, unprocessed_query
+)
+from planner import PlanWriter, describe
+
+# Kelas hasil rekonsiliasi satu nama file
+BOTH, FTP_ONLY, MONGO_ONLY = 'both', 'ftp_only', 'mongo_only'
+
+# Tulis progres setiap sekian nama yang dibandingkan
+PROGRESS_EVERY = 1000000
+
+# Kelompokkan dokumen berurutan dengan `value` yang sama. Urutan dicek karena
+# merge-join hanya benar jika MongoDB mengurutkan sama seperti Python
+# (collation bawaan membandingkan byte UTF-8, sama dengan urutan code point).
+def _grouped(documents):
+    name, group = None, []
+    for document in documents:
+        value = document['value']
+        if group and value != name:
+            if value < name:
+                raise ValueError(f"Dokumen MongoDB tidak urut nama: {value!r} setelah {name!r}")
+            yield name, group
+            group = []
+        name = value
+        group.append(document)
+    if group:
+        yield name, group
+
+# Gabungkan dua aliran yang sama-sama urut nama dalam satu lintasan linear.
+# Menghasilkan (kelas, nama, dokumen dengan nama itu, entri FTP atau None).
+def merge_join(documents, entries):
+    groups, entries = _grouped(documents), iter(entries)
+    group, entry = next(groups, None), next(entries, None)
+    previous = None
+    while group is not None or entry is not None:
+        if entry is not None and previous is not None and entry.name <= previous:
+            raise ValueError(f"Listing FTP tidak urut nama: {entry.name!r} setelah {previous!r}")
+        if entry is None or (group is not None and group[0] < entry.name):
+            yield MONGO_ONLY, group[0], group[1], None
+            group = next(groups, None)
+        elif group is None or entry.name < group[0]:
+            yield FTP_ONLY, entry.name, [], entry
+            previous, entry = entry.name, next(entries, None)
+        else:
+            yield BOTH, entry.name, group[1], entry
+            previous, entry = entry.name, next(entries, None)
+            group = next(groups, None)
+
+# Dokumen yang belum diproses, urut `value` lewat index sehingga MongoDB tidak
+# mengurutkan di memori. Dokumen tanpa nama file (atau bukan `suffix`) dilewati.
+def history_by_name(collection, suffix='.jpg'):
+    ensure_history_index(collection, VALUE_INDEX, VALUE_INDEX_NAME)
+    documents = iter_history(collection, unprocessed_query(), sort=VALUE_INDEX, hint=VALUE_INDEX_NAME)
+    return (
+        document for document in documents
+        if isinstance(document.get('value'), str) and document['value'].lower().endswith(suffix)
+    )
+
+# Rekonsiliasi dokumen (urut nama) dengan listing FTP (urut nama):
+# - ada di keduanya -> item rencana `plan` (dijalankan dengan move_all.py --plan)
+# - hanya di FTP (orphan) -> missing 'mongo', dan item rencana `orphans` jika ada (main.py)
+# - hanya di MongoDB (file sudah hilang) -> missing 'ftp', dan ditandai lewat
+#   `status_writer` jika ada, hanya untuk dokumen yang lebih tua dari `cutoff`
+def reconcile(documents, entries, plan, orphans=None, status_writer=None, cutoff=None):
+    counts = {BOTH: 0, FTP_ONLY: 0, MONGO_ONLY: 0, 'duplicates': 0, 'marked': 0}
+    compared = 0
+    for kind, name, group, entry in merge_join(documents, entries):
+        counts[kind] += 1
+        compared += 1
+        if kind == BOTH:
+            # Dokumen ganda untuk satu file: cukup satu yang memindahkan
+            counts['duplicates'] += len(group) - 1
+            plan.add(name, entry.size, group[0])
+        elif kind == FTP_ONLY:
+            plan.missing(name, 'mongo')
+            if orphans is not None:
+                orphans.add(name, entry.size)
+        else:
+            plan.missing(name, 'ftp')
+            if status_writer is not None:
+                for document in group:
+                    created_at = document.get('createdAt')
+                    if created_at is not None and cutoff is not None and created_at < cutoff:
+                        status_writer.mark_processed(document['_id'], missingOnFtp=True)
+                        counts['marked'] += 1
+        if compared % PROGRESS_EVERY == 0:
+            logging.info(
+                f"Rekonsiliasi: {compared} nama, {counts[BOTH]} cocok, {counts[FTP_ONLY]} hanya di FTP, "
+                f"{counts[MONGO_ONLY]} hanya di MongoDB."
+            )
+    return counts
+
+# Perintah: bandingkan koleksi history dengan direktori FTP lalu tulis rencana
+def main():
+    from dotenv import load_dotenv
+    from log_setup import setup_logging
+    from mover import SiteRunner, site_from_env
+
+    load_dotenv()
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Rekonsiliasi history MongoDB dengan listing FTP")
+    parser.add_argument('-o', '--output', default=os.getenv('RECONCILE_PLAN_FILE', 'rekonsiliasi.jsonl'),
+                        help="Rencana file yang ada di keduanya (python move_all.py --plan)")
+    parser.add_argument('--orphans', help="Rencana file yang hanya ada di FTP (main.py, pilihan 4)")
+    parser.add_argument('--mark-gone', action='store_true',
+                        help="Tandai dokumen yang file-nya sudah tidak ada di FTP (process=true, missingOnFtp=true)")
+    parser.add_argument('--grace-minutes', type=int, default=int(os.getenv('RECONCILE_GRACE_MINUTES', 60)),
+                        help="Dokumen yang lebih baru dari ini tidak ditandai (file mungkin belum terunggah)")
+    args = parser.parse_args()
+
+    site = site_from_env('default')
+    runner = SiteRunner(site)
+    session = None
+    status_writer = None
+    try:
+        plan = PlanWriter(args.output, 'db', 'reconcile')
+        orphans = PlanWriter(args.orphans, 'ftp', 'orphans') if args.orphans else None
+        if args.mark_gone:
+            status_writer = StatusWriter(
+                runner.collection, os.getenv('RECONCILE_SPOOL_FILE', 'reconcile_spool.jsonl'),
+                site.status_batch_size, site.status_flush_interval, site.name
+            )
+        cutoff = datetime.utcnow() - timedelta(minutes=args.grace_minutes)
+        # Listing FTP dibaca dan diurutkan sampai habis sebelum dokumen pertama dibandingkan
+        session = runner.pool.acquire()
+        entries = sorted_listing(iter_listing(session))
+        counts = reconcile(history_by_name(runner.collection), entries, plan, orphans, status_writer, cutoff)
+        header = plan.finish()
+        print(describe(header, plan.examples))
+        print(f"Rencana disimpan di {plan.path}")
+        if orphans is not None:
+            orphans.finish()
+            print(f"{counts[FTP_ONLY]} file orphan disimpan di {orphans.path}")
+        if counts['duplicates']:
+            print(f"Dokumen ganda untuk file yang sama: {counts['duplicates']}")
+        if status_writer is not None:
+            print(f"Dokumen ditandai sudah hilang dari FTP: {counts['marked']}")
+    except Exception as e:
+        logging.error(f"Rekonsiliasi gagal: {e}")
+        # Koneksi data MLSD mungkin masih terbuka; sesi tidak dikembalikan ke pool
+        if session is not None:
+            runner.pool.discard(session)
+            session = None
+        sys.exit(1)
+    finally:
+        if status_writer is not None:
+            status_writer.close()
+        if session is not None:
+            runner.pool.release(session)
+        runner.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Rentang nilai kolom cron: menit, jam, tanggal, bulan, hari (0 dan 7 = Minggu)
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+# Tidur paling lama sekian detik sekali jalan agar perubahan jam sistem tetap terkejar
+MAX_SLEEP = 3600
+
+# Nilai yang cocok untuk satu kolom cron: '*', '5', '1-5', '*/15', '10-50/10', '1,15'
+def _parse_field(text, low, high):
+    values = set()
+    for part in text.split(','):
+        span, _, step = part.partition('/')
+        if span == '*':
+            start, end = low, high
+        elif '-' in span:
+            start, end = (int(value) for value in span.split('-', 1))
+        else:
+            start = int(span)
+            end = high if step else start
+        step = int(step) if step else 1
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(part)
+        values.update(range(start, end + 1, step))
+    return values
+
+# Ekspresi cron 5 kolom (menit jam tanggal bulan hari) dalam waktu lokal
+class CronExpression:
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Ekspresi cron harus 5 kolom: {expression!r}")
+        try:
+            parsed = [_parse_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELDS)]
+        except ValueError:
+            raise ValueError(f"Ekspresi cron tidak valid: {expression!r}") from None
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months = parsed[:4]
+        self.weekdays = {day % 7 for day in parsed[4]}
+        # Seperti cron biasa: jika tanggal dan hari sama-sama dibatasi, cukup salah satu yang cocok
+        self.either_day = fields[2] != '*' and fields[4] != '*'
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = moment.isoweekday() % 7 in self.weekdays
+        return (day or weekday) if self.either_day else (day and weekday)
+
+    # Waktu jatuh tempo pertama setelah `moment` (datetime lokal tanpa zona)
+    def next_after(self, moment):
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Ekspresi cron tidak pernah jatuh tempo: {self.expression!r}")
+
+    def __str__(self):
+        return self.expression
+
+# Satu job terjadwal: cron, interval (detik sejak run terakhir selesai), dan/atau
+# pemicu dari luar. Pemicu dijalankan paling cepat `debounce` detik setelah run
+# sebelumnya dimulai sehingga banyak pemicu beruntun digabung menjadi satu run.
+class Job:
+    def __init__(self, name, fn, cron=None, interval=None, debounce=0):
+        self.name = name
+        self.fn = fn
+        self.cron = CronExpression(cron) if cron else None
+        self.interval = interval
+        self.debounce = debounce
+        self.triggered = False
+        # Sudah diserahkan ke executor dan belum selesai
+        self.running = False
+        self.last_start = 0.0
+        self.next_run = None
+        self._lock = threading.Lock()
+        self.schedule_next(time.time())
+
+    # Hitung jadwal berikutnya setelah `now`; None = hanya berjalan lewat pemicu
+    def schedule_next(self, now):
+        if self.cron is not None:
+            self.next_run = self.cron.next_after(datetime.fromtimestamp(now)).timestamp()
+        elif self.interval:
+            self.next_run = now + self.interval
+        else:
+            self.next_run = None
+
+    # Waktu job ini jatuh tempo berikutnya, atau None jika tidak ada
+    def due_at(self):
+        times = [self.next_run] if self.next_run is not None else []
+        if self.triggered:
+            times.append(self.last_start + self.debounce)
+        return min(times) if times else None
+
+# Scheduler yang tidur sampai job berikutnya jatuh tempo atau sampai ada pemicu,
+# bukan memeriksa jadwal setiap detik. Tanpa `executor`, job dijalankan berurutan
+# di thread pemanggil `run_forever` (sehingga SIGTERM tetap menghentikan run yang
+# sedang berjalan seperti sebelumnya); dengan `executor` (misalnya
+# ThreadPoolExecutor di daemon.py) job yang jatuh tempo diserahkan ke executor
+# sehingga job berbeda bisa berjalan bersamaan. Run yang tumpang tindih untuk
+# job yang sama ditolak: jadwal yang terlewat selama run berjalan tidak
+# diantrekan, sedangkan pemicu yang datang selama run menghasilkan satu run susulan.
+class Scheduler:
+    def __init__(self, executor=None):
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._executor = executor
+
+    def add_job(self, name, fn, cron=None, interval=None, debounce=0):
+        job = Job(name, fn, cron, interval, debounce)
+        with self._cond:
+            self._jobs[name] = job
+            self._cond.notify()
+        if job.next_run is not None:
+            logging.info(f"Job {name} dijadwalkan, run pertama {datetime.fromtimestamp(job.next_run):%Y-%m-%d %H:%M:%S}.")
+        return job
+
+    # Minta job segera dijalankan; aman dipanggil dari thread lain (misalnya change stream)
+    def trigger(self, name):
+        with self._cond:
+            self._jobs[name].triggered = True
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    # Jalankan satu job sekarang. False jika job yang sama masih berjalan.
+    def run_job(self, job):
+        if not job._lock.acquire(blocking=False):
+            logging.warning(f"Job {job.name} masih berjalan, run ini ditolak.")
+            return False
+        started = time.time()
+        try:
+            with self._cond:
+                reason = 'pemicu' if job.triggered and (job.next_run is None or job.next_run > started) else 'jadwal'
+                job.triggered = False
+                job.last_start = started
+            logging.debug(f"Menjalankan job {job.name} ({reason})...")
+            job.fn()
+        except Exception as e:
+            logging.error(f"Job {job.name} gagal: {e}")
+        finally:
+            job._lock.release()
+        finished = time.time()
+        if job.cron is not None:
+            missed = job.cron.next_after(datetime.fromtimestamp(started))
+            if missed.timestamp() < finished:
+                logging.warning(f"Job {job.name} masih berjalan pada jadwal {missed:%H:%M}, jadwal tersebut dilewati.")
+        with self._cond:
+            job.schedule_next(finished)
+        return True
+
+    # Jalankan job yang sudah ditandai `running`, lalu bangunkan loop utama
+    def _dispatch(self, job):
+        try:
+            self.run_job(job)
+        finally:
+            with self._cond:
+                job.running = False
+                self._cond.notify()
+
+    # Loop utama: tidur sampai ada job yang jatuh tempo, lalu jalankan
+    # (langsung, atau lewat executor jika ada)
+    def run_forever(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    now = time.time()
+                    times = [
+                        (job.due_at(), job) for job in self._jobs.values()
+                        if not job.running and job.due_at() is not None
+                    ]
+                    due = [job for at, job in sorted(times, key=lambda pair: pair[0]) if at <= now]
+                    if due:
+                        for job in due:
+                            job.running = True
+                        break
+                    wake = min((at for at, _ in times), default=now + MAX_SLEEP)
+                    self._cond.wait(min(wake - now, MAX_SLEEP))
+            for job in due:
+                if self._executor is None:
+                    self._dispatch(job)
+                else:
+                    self._executor.submit(self._dispatch, job)
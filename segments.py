@@ -0,0 +1,239 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tarfile
+import threading
+import time
+from ftp_listing import parse_day
+
+# zstandard opsional; tanpa paket ini segmen ditulis sebagai tar biasa
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Periode segmen: satu rangkaian segmen per hari atau per bulan
+PERIODS = ('day', 'month')
+
+# Kunci periode dari prefix nama 'YYYYMMDD_' (atau createdAt MongoDB)
+def period_key(file_name, period, created_at=None):
+    day = parse_day(file_name)
+    if day is None and created_at is not None:
+        day = created_at.strftime('%Y%m%d')
+    if day is None:
+        return 'undated'
+    return day if period == 'day' else day[:6]
+
+# Satu file segmen yang sedang ditulis beserta indeks sidecar-nya (.idx, JSON lines).
+# Segmen yang ditutup rapi punya penanda `.end` berisi offset penanda akhir tar,
+# sehingga run berikutnya bisa memotong penanda itu dan melanjutkan segmen yang sama.
+class _Segment:
+    def __init__(self, path, compress, resume_at=None):
+        self.path = path
+        self.file = open(path, 'r+b' if resume_at is not None else 'ab')
+        if resume_at is not None:
+            self.file.truncate(resume_at)
+            self.file.seek(resume_at)
+            os.remove(path + '.end')
+        self.index = open(path + '.idx', 'a')
+        self.compressor = zstandard.ZstdCompressor() if compress else None
+        self.failed = False
+
+    # Tulis blok data sebagai satu frame zstd (atau apa adanya untuk tar biasa)
+    def write_frame(self, chunks):
+        if self.compressor is None:
+            for chunk in chunks:
+                self.file.write(chunk)
+            return
+        frame = self.compressor.compressobj()
+        for chunk in chunks:
+            self.file.write(frame.compress(chunk))
+        self.file.write(frame.flush())
+
+    def close(self):
+        # Penanda akhir arsip tar: dua blok kosong
+        end = self.file.tell()
+        self.write_frame([tarfile.NUL * tarfile.BLOCKSIZE * 2])
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.index.close()
+        # Segmen dengan penulisan gagal tidak dilanjutkan; run berikutnya memakai nomor baru
+        if not self.failed:
+            save_end(self.path, end, os.path.getsize(self.path))
+
+def save_end(path, end, size):
+    with open(path + '.end', 'w') as marker:
+        json.dump({'end': end, 'size': size}, marker)
+
+# Offset penanda akhir tar jika segmen ditutup rapi dan belum berubah sesudahnya
+def clean_end(path):
+    try:
+        with open(path + '.end') as marker:
+            state = json.load(marker)
+    except (OSError, ValueError):
+        return None
+    if os.path.getsize(path) != state.get('size'):
+        return None
+    return state.get('end')
+
+# Penulis segmen tar bergulir per hari/bulan. Setiap file ditulis sebagai satu
+# member tar (dengan zstd, satu frame per member) sehingga segmen bisa dibaca
+# berurutan dengan tar biasa, sementara indeks sidecar menyimpan offset setiap
+# member untuk akses acak. Segmen baru dibuka saat ukurannya melewati `max_bytes`.
+class SegmentWriter:
+    def __init__(self, root, period='day', compress=None, max_bytes=1024 ** 3):
+        if period not in PERIODS:
+            raise ValueError(f"Periode segmen tidak dikenal: {period}")
+        if compress == 'zstd' and zstandard is None:
+            logging.warning("zstandard tidak terpasang, segmen ditulis sebagai tar tanpa kompresi.")
+            compress = None
+        self.root = root
+        self.period = period
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.suffix = '.tar.zst' if compress else '.tar'
+        self._segments = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # Lanjutkan segmen terakhir untuk `key` jika ditutup rapi dan belum penuh.
+    # Segmen dari run yang terputus atau gagal menulis tidak ditambah (agar tidak
+    # ada member setengah jadi di tengah); segmen baru memakai nomor urut berikutnya.
+    def _open(self, key):
+        seq = 1
+        while os.path.exists(os.path.join(self.root, f'{key}-{seq:04d}{self.suffix}')):
+            seq += 1
+        if seq > 1:
+            path = os.path.join(self.root, f'{key}-{seq - 1:04d}{self.suffix}')
+            end = clean_end(path)
+            if end is not None and end < self.max_bytes:
+                segment = _Segment(path, self.compress, resume_at=end)
+                self._segments[key] = segment
+                return segment
+        segment = _Segment(os.path.join(self.root, f'{key}-{seq:04d}{self.suffix}'), self.compress)
+        self._segments[key] = segment
+        return segment
+
+    # Tambahkan satu file dari `source` (objek file di posisi awal) berukuran
+    # `size`. Data di-fsync sebelum kembali, jadi aman menghapus file di FTP
+    # setelahnya. Mengembalikan (path segmen, entri indeks).
+    def append(self, file_name, source, size, checksum=None, created_at=None, blocksize=1024 * 1024):
+        info = tarfile.TarInfo(file_name)
+        info.size = size
+        info.mtime = time.time()
+        info.mode = 0o644
+        header = info.tobuf(tarfile.GNU_FORMAT)
+        padding = tarfile.NUL * ((-size) % tarfile.BLOCKSIZE)
+        key = period_key(file_name, self.period, created_at)
+
+        def chunks():
+            yield header
+            while True:
+                data = source.read(blocksize)
+                if not data:
+                    break
+                yield data
+            yield padding
+
+        with self._lock:
+            segment = self._segments.get(key) or self._open(key)
+            offset = segment.file.tell()
+            try:
+                segment.write_frame(chunks())
+                segment.file.flush()
+                os.fsync(segment.file.fileno())
+            except Exception:
+                # Buang member yang belum lengkap; segmen ini tidak dilanjutkan lagi
+                segment.failed = True
+                segment.file.truncate(offset)
+                segment.file.seek(offset)
+                raise
+            entry = {
+                'name': file_name, 'offset': offset, 'length': segment.file.tell() - offset,
+                'header': len(header), 'size': size,
+            }
+            if checksum is not None:
+                entry.update(checksum=checksum.hexdigest(), algorithm=checksum.algorithm)
+            segment.index.write(json.dumps(entry) + '\n')
+            segment.index.flush()
+            path = segment.path
+            if segment.file.tell() >= self.max_bytes:
+                segment.close()
+                del self._segments[key]
+        return path, entry
+
+    # Buang member yang gagal diverifikasi agar percobaan ulang tidak membuat
+    # member ganda: entrinya dihapus dari indeks sidecar, dan datanya dipotong
+    # jika masih member terakhir segmen yang terbuka
+    def discard(self, segment_path, entry):
+        with self._lock:
+            segment = next((s for s in self._segments.values() if s.path == segment_path), None)
+            if segment is not None:
+                if segment.file.tell() == entry['offset'] + entry['length']:
+                    segment.file.truncate(entry['offset'])
+                    segment.file.seek(entry['offset'])
+                segment.index.close()
+            index_path = segment_path + '.idx'
+            with open(index_path) as index:
+                lines = [line for line in index if json.loads(line)['offset'] != entry['offset']]
+            with open(index_path + '.tmp', 'w') as index:
+                index.writelines(lines)
+            os.replace(index_path + '.tmp', index_path)
+            if segment is not None:
+                segment.index = open(index_path, 'a')
+
+    def close(self):
+        with self._lock:
+            for segment in self._segments.values():
+                segment.close()
+            self._segments.clear()
+
+# Baca satu file dari segmen memakai indeks sidecar tanpa membaca seluruh segmen
+def read_member(segment_path, file_name):
+    entry = None
+    with open(segment_path + '.idx') as index:
+        for line in index:
+            candidate = json.loads(line)
+            if candidate['name'] == file_name:
+                entry = candidate
+    if entry is None:
+        raise KeyError(f"{file_name} tidak ada di {segment_path}")
+    with open(segment_path, 'rb') as segment:
+        segment.seek(entry['offset'])
+        if segment_path.endswith('.zst'):
+            member = zstandard.ZstdDecompressor().decompressobj().decompress(segment.read(entry['length']))
+            return member[entry['header']:entry['header'] + entry['size']]
+        segment.seek(entry['offset'] + entry['header'])
+        return segment.read(entry['size'])
+
+# Perintah: daftar isi segmen dari indeks, atau ambil satu file
+def main():
+    parser = argparse.ArgumentParser(description="Segmen arsip tar hasil housekeeping FTP")
+    commands = parser.add_subparsers(dest='command', required=True)
+    listing = commands.add_parser('list', help="Tampilkan isi segmen dari indeks sidecar")
+    listing.add_argument('segment')
+    extract = commands.add_parser('extract', help="Ambil satu file dari segmen")
+    extract.add_argument('segment')
+    extract.add_argument('name')
+    extract.add_argument('-o', '--output', help="File tujuan (bawaan: nama file di direktori kerja)")
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        with open(args.segment + '.idx') as index:
+            for line in index:
+                entry = json.loads(line)
+                print(f"{entry['name']}\t{entry['size']}\t{entry['offset']}")
+        return
+    try:
+        data = read_member(args.segment, args.name)
+    except KeyError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    with open(args.output or args.name, 'wb') as output:
+        output.write(data)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pymongo.errors import OperationFailure, PyMongoError
+from mongo_utils import HISTORY_PROJECTION
+from watermark import load_json, save_json
+
+# Cara mengikuti dokumen baru: 'change_stream' (butuh replica set), 'tail'
+# (query _id > terakhir secara berkala, untuk server standalone), atau 'auto'
+STREAM_METHODS = ('auto', 'change_stream', 'tail')
+
+# Kode error MongoDB: change stream hanya untuk replica set / token sudah hilang dari oplog
+CHANGE_STREAM_UNSUPPORTED = 40573
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# Aliran dokumen history baru begitu masuk ke koleksi, untuk diteruskan ke
+# mesin transfer. Posisi (resume token change stream dan _id terakhir)
+# disimpan ke `state_path` hanya setelah semua dokumen sebelumnya selesai
+# (`done`), sehingga restart tidak kehilangan maupun mengulang dokumen.
+class HistoryTail:
+    def __init__(self, collection, state_path, method='auto', poll_interval=1.0, max_await_ms=1000):
+        if method not in STREAM_METHODS:
+            raise ValueError(f"Metode streaming tidak dikenal: {method}")
+        self.collection = collection
+        self.state_path = os.path.abspath(state_path)
+        self.method = method
+        self.poll_interval = poll_interval
+        self.max_await_ms = max_await_ms
+        self._state = load_json(self.state_path) or {}
+        # _id terakhir yang sudah diteruskan (bisa lebih maju dari posisi tersimpan)
+        self._last_id = self._state.get('last_id')
+        self._token = self._state.get('token')
+        # Cara yang sedang dipakai ('change_stream' atau 'tail'), ikut disimpan di posisi
+        self._mode = 'tail'
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    # Change stream selalu dicoba lebih dulu (kecuali method 'tail'), juga jika
+    # run sebelumnya berakhir dengan query _id: posisi _id tersimpan dikejar lewat
+    # query lalu stream dilanjutkan. Query berkala hanya jika stream gagal lagi.
+    def __iter__(self):
+        if not self._state:
+            self._start_from_latest()
+        if self.method != 'tail':
+            if (yield from self._watch()):
+                return
+        yield from self._tail()
+
+    # Run pertama: mulai dari dokumen terbaru; dokumen lama yang belum diproses
+    # tetap menjadi bagian move_all.py / move_daily.py. Posisi langsung disimpan
+    # agar dokumen yang masuk selama proses mati tetap terkejar setelah restart.
+    def _start_from_latest(self):
+        latest = self.collection.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+        self._state = {'last_id': latest['_id'] if latest else None}
+        self._last_id = self._state['last_id']
+        save_json(self.state_path, self._state)
+        logging.info("Posisi streaming belum ada, mulai dari dokumen terbaru.")
+
+    # Ikuti insert lewat change stream. True jika berhenti karena stop();
+    # False jika harus pindah ke query _id (server tidak mendukung change stream).
+    # Tanpa resume token, stream dibuka lebih dulu lalu dokumen _id > terakhir
+    # dikejar lewat query; event untuk dokumen yang sudah dikejar dilewati.
+    def _watch(self):
+        pipeline = [
+            {'$match': {'operationType': 'insert'}},
+            {'$project': {f'fullDocument.{field}': 1 for field in HISTORY_PROJECTION}},
+        ]
+        self._mode = 'change_stream'
+        delay = 1
+        while not self._stopped.is_set():
+            try:
+                with self.collection.watch(
+                    pipeline, resume_after=self._token, max_await_time_ms=self.max_await_ms
+                ) as stream:
+                    logging.info("Streaming dokumen baru lewat change stream MongoDB.")
+                    delay = 1
+                    caught_up = self._last_id
+                    if self._token is None:
+                        yield from self._catch_up()
+                        caught_up = self._last_id
+                    while not self._stopped.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is None:
+                            continue
+                        document = change['fullDocument']
+                        if self._token is None and caught_up is not None and document['_id'] <= caught_up:
+                            continue
+                        yield self._track(document, change['_id'])
+                    return True
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_HISTORY_LOST and self._token is not None:
+                    # Token sudah keluar dari oplog: buka stream baru tanpa token
+                    # lalu kejar ketertinggalan dari _id terakhir
+                    logging.warning(f"Resume token change stream sudah kedaluwarsa, mengejar lewat query _id: {e}")
+                    self._token = None
+                    continue
+                if self.method == 'auto' or e.code == CHANGE_STREAM_UNSUPPORTED:
+                    logging.warning(f"Change stream tidak tersedia, memakai query _id: {e}")
+                    return False
+                raise
+            except PyMongoError as e:
+                logging.warning(f"Change stream terputus: {e}. Mencoba lagi dalam {delay} detik...")
+                self._stopped.wait(delay)
+                delay = min(delay * 2, 60)
+        return True
+
+    # Satu kali query dokumen _id > _id terakhir, urut _id.
+    # Mengandalkan _id (ObjectId) yang naik sesuai urutan insert.
+    def _catch_up(self):
+        query = {'process': {'$ne': True}}
+        if self._last_id is not None:
+            query['_id'] = {'$gt': self._last_id}
+        for document in self.collection.find(query, HISTORY_PROJECTION).sort('_id', 1):
+            yield self._track(document)
+            if self._stopped.is_set():
+                return
+
+    # Ikuti dokumen baru dengan query _id > _id terakhir secara berkala
+    def _tail(self):
+        self._mode = 'tail'
+        logging.info(f"Streaming dokumen baru lewat query _id setiap {self.poll_interval} detik.")
+        while not self._stopped.is_set():
+            try:
+                yield from self._catch_up()
+            except PyMongoError as e:
+                logging.warning(f"Query streaming gagal: {e}")
+            self._stopped.wait(self.poll_interval)
+
+    # Catat posisi dokumen yang diteruskan; `token` None berarti dari query _id
+    def _track(self, document, token=None):
+        self._last_id, self._token = document['_id'], token
+        position = {'method': self._mode, 'token': token, 'last_id': self._last_id}
+        with self._lock:
+            self._pending[document['_id']] = [position, False]
+        return document
+
+    # Dokumen selesai (berhasil atau gagal); posisi maju sampai dokumen
+    # tertua yang belum selesai. Dokumen yang gagal tetap process != true.
+    def done(self, document):
+        with self._lock:
+            entry = self._pending.get(document['_id'])
+            if entry is None:
+                return
+            entry[1] = True
+            position = None
+            while self._pending:
+                first = next(iter(self._pending.values()))
+                if not first[1]:
+                    break
+                position = self._pending.popitem(last=False)[1][0]
+            if position is not None:
+                self._state = position
+                save_json(self.state_path, position)
+
+    def stop(self):
+        self._stopped.set()
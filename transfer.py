@@ -0,0 +1,448 @@
+import ftplib
+import json
+import logging
+import os
+import queue
+import select
+import socket
+import threading
+import time
+from metrics import track_phase, ACTIVE_CONNECTIONS, QUEUE_DEPTH
+
+# Jumlah percobaan membuat sesi FTP baru sebelum sebuah file dianggap gagal
+RECONNECT_ATTEMPTS = 3
+RECONNECT_DELAY = 2
+
+# Offset unduhan dicatat ke journal setiap kelipatan ukuran ini
+JOURNAL_INTERVAL = 4 * 1024 * 1024
+
+# Ukuran blok baca koneksi data (FTP_BLOCKSIZE); ftplib memakai 8 KiB
+DEFAULT_BLOCKSIZE = 1024 * 1024
+
+# Sesi dicek dengan NOOP hanya setelah menganggur sekian detik (FTP_IDLE_CHECK)
+DEFAULT_IDLE_CHECK = 30
+
+# Jumlah DELE yang dikirim sekaligus pada koneksi kontrol (FTP_DELETE_BATCH); 1 = satu per satu
+DEFAULT_DELETE_BATCH = 16
+
+# Penanda akhir antrean untuk worker
+_STOP = object()
+
+# Cek apakah error menandakan sesi FTP sudah mati (bukan sekadar file gagal)
+def is_connection_error(e):
+    if isinstance(e, ftplib.error_temp):
+        # 421 = server menutup koneksi kontrol
+        return str(e).startswith('421')
+    return isinstance(e, (EOFError, ConnectionError, TimeoutError, socket.timeout))
+
+# Tutup sesi FTP tanpa melempar error
+def close_ftp(ftp):
+    try:
+        ftp.quit()
+    except Exception:
+        try:
+            ftp.close()
+        except Exception:
+            pass
+
+# Tandai sesi baru saja dipakai
+def touch(ftp):
+    ftp._last_used = time.monotonic()
+
+# Cek sesi dengan NOOP hanya jika sudah menganggur minimal `max_idle` detik,
+# bukan di setiap file. Error koneksi dilempar agar sesi dibuat ulang.
+def check_alive(ftp, max_idle=DEFAULT_IDLE_CHECK):
+    last_used = getattr(ftp, '_last_used', None)
+    if last_used is not None and time.monotonic() - last_used >= max_idle:
+        ftp.voidcmd('NOOP')
+    touch(ftp)
+
+# Kirim beberapa DELE sekaligus tanpa menunggu balasan satu per satu
+# (pipelining pada koneksi kontrol), lalu baca balasannya berurutan.
+# `on_deleted(name)` dipanggil begitu balasan sukses diterima sehingga
+# pemanggil tahu file mana yang sudah terhapus jika koneksi putus di tengah.
+# Mengembalikan {nama: error} untuk file yang gagal; error koneksi dilempar.
+def delete_files(ftp, names, on_deleted=None):
+    failed = {}
+    sent = []
+    for name in names:
+        if '\r' in name or '\n' in name:
+            failed[name] = ValueError(f"Nama file tidak valid: {name!r}")
+        else:
+            sent.append(name)
+    if not sent:
+        return failed
+    ftp.sock.sendall(''.join(f'DELE {name}\r\n' for name in sent).encode(ftp.encoding))
+    for name in sent:
+        try:
+            resp = ftp.getresp()
+            if resp[:3] not in ('250', '200'):
+                raise ftplib.error_reply(resp)
+        except ftplib.Error as e:
+            if is_connection_error(e):
+                raise
+            failed[name] = e
+            continue
+        if on_deleted is not None:
+            on_deleted(name)
+    touch(ftp)
+    return failed
+
+# Pool sesi FTP yang sudah login, jumlahnya dibatasi sebanyak `size`.
+# Sesi menganggur dicek dengan NOOP saat diambil jika sudah lebih dari `max_idle` detik.
+class FtpPool:
+    def __init__(self, connect_fn, size, name='default', max_idle=None):
+        self.connect_fn = connect_fn
+        self.size = size
+        self.name = name
+        self.max_idle = max_idle if max_idle is not None else float(os.getenv('FTP_IDLE_CHECK', DEFAULT_IDLE_CHECK))
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    # Ambil sesi dari pool, buat sesi baru jika belum ada yang menganggur
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            ftp = self._idle.get_nowait()
+            check_alive(ftp, self.max_idle)
+            return ftp
+        except queue.Empty:
+            pass
+        except Exception as e:
+            # Sesi mati selama menganggur: tutup dan buat sesi baru di slot yang sama
+            logging.warning(f"Sesi FTP menganggur tidak merespons NOOP, dibuat ulang: {e}")
+            close_ftp(ftp)
+            ACTIVE_CONNECTIONS.labels(self.name).dec()
+        try:
+            with track_phase(self.name, 'connect'):
+                ftp = self.connect_fn()
+        except Exception:
+            self._slots.release()
+            raise
+        touch(ftp)
+        ACTIVE_CONNECTIONS.labels(self.name).inc()
+        return ftp
+
+    # Kembalikan sesi yang masih sehat ke pool
+    def release(self, ftp):
+        touch(ftp)
+        self._idle.put(ftp)
+        self._slots.release()
+
+    # Buang sesi yang sudah mati agar slotnya bisa dipakai sesi baru
+    def discard(self, ftp):
+        close_ftp(ftp)
+        ACTIVE_CONNECTIONS.labels(self.name).dec()
+        self._slots.release()
+
+    # Cek kesehatan sesi menganggur di antara run: NOOP ke sesi yang sudah
+    # menganggur minimal `max_idle` detik (agar tidak diputus server), sesi yang
+    # mati dibuang. Sesi yang sedang dipakai tidak disentuh. Mengembalikan
+    # jumlah sesi menganggur yang sehat.
+    def keepalive(self, max_idle=0):
+        healthy = []
+        while self._slots.acquire(blocking=False):
+            try:
+                ftp = self._idle.get_nowait()
+            except queue.Empty:
+                self._slots.release()
+                break
+            if time.monotonic() - ftp._last_used < max_idle:
+                healthy.append((ftp, ftp._last_used))
+                continue
+            try:
+                ftp.voidcmd('NOOP')
+            except Exception as e:
+                logging.warning(f"Sesi FTP menganggur tidak merespons NOOP, dibuang: {e}")
+                self.discard(ftp)
+                continue
+            healthy.append((ftp, time.monotonic()))
+        for ftp, last_used in healthy:
+            self.release(ftp)
+            ftp._last_used = last_used
+        return len(healthy)
+
+    # Tutup semua sesi yang sedang menganggur
+    def close(self):
+        while True:
+            try:
+                close_ftp(self._idle.get_nowait())
+            except queue.Empty:
+                break
+            ACTIVE_CONNECTIONS.labels(self.name).dec()
+
+# Ambil sesi dari pool dengan beberapa kali percobaan
+def acquire_session(pool):
+    for attempt in range(1, RECONNECT_ATTEMPTS + 1):
+        try:
+            return pool.acquire()
+        except Exception as e:
+            logging.warning(f"Gagal membuat sesi FTP (percobaan {attempt}/{RECONNECT_ATTEMPTS}): {e}")
+            if attempt < RECONNECT_ATTEMPTS:
+                time.sleep(RECONNECT_DELAY * attempt)
+    return None
+
+# Worker: proses item dari antrean memakai satu sesi FTP miliknya sendiri
+def _worker(pool, tasks, process_fn, stats, lock, limiter, on_done):
+    ftp = None
+    while True:
+        item = tasks.get()
+        if item is _STOP:
+            break
+        QUEUE_DEPTH.labels(pool.name, 'transfer').set(tasks.qsize())
+        ok = False
+        # Satu kali ulang dengan sesi baru jika sesi lama mati di tengah jalan
+        for _ in range(2):
+            if ftp is None:
+                ftp = acquire_session(pool)
+                if ftp is None:
+                    break
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                # process_fn mengembalikan False jika file gagal tanpa merusak sesi
+                ok = process_fn(ftp, item) is not False
+                if ok and limiter is not None:
+                    limiter.on_success()
+                break
+            except Exception as e:
+                if limiter is not None:
+                    limiter.on_error(e)
+                if not is_connection_error(e):
+                    logging.error(f"Gagal memproses item {item}: {e}")
+                    break
+                logging.warning(f"Koneksi FTP terputus ({e}). Membuat ulang sesi...")
+                pool.discard(ftp)
+                ftp = None
+        if ftp is not None:
+            touch(ftp)
+        with lock:
+            stats['ok' if ok else 'failed'] += 1
+        if on_done is not None:
+            on_done(item, ok)
+    if ftp is not None:
+        pool.release(ftp)
+
+# Jalankan process_fn(ftp, item) untuk setiap item secara paralel
+# memakai sejumlah `workers` sesi FTP dari pool, opsional dibatasi `limiter`.
+# `on_done(item, ok)` dipanggil setelah setiap item selesai atau gagal.
+def run_transfers(pool, items, process_fn, workers=None, limiter=None, on_done=None):
+    workers = workers or pool.size
+    tasks = queue.Queue(maxsize=workers * 2)
+    stats = {'ok': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    threads = [
+        threading.Thread(target=_worker, args=(pool, tasks, process_fn, stats, lock, limiter, on_done), daemon=True)
+        for _ in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for item in items:
+            tasks.put(item)
+    finally:
+        for _ in threads:
+            tasks.put(_STOP)
+        for thread in threads:
+            thread.join()
+
+    logging.info(f"Transfer selesai: {stats['ok']} berhasil, {stats['failed']} gagal.")
+    return stats
+
+# Lokasi file sementara dan journal untuk unduhan `local_path`
+def part_paths(local_path):
+    part_path = local_path + '.part'
+    return part_path, part_path + '.json'
+
+def _write_journal(journal_path, file_name, remote_size, offset):
+    with open(journal_path, 'w') as journal:
+        json.dump({'name': file_name, 'size': remote_size, 'offset': offset}, journal)
+
+def _discard_part(local_path):
+    for path in part_paths(local_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+# Tentukan offset lanjutan dari .part dan journal; mulai dari nol jika file
+# di server berubah ukuran atau journal tidak cocok
+def resume_offset(local_path, file_name, remote_size):
+    part_path, journal_path = part_paths(local_path)
+    if not os.path.exists(part_path) or not os.path.exists(journal_path):
+        _discard_part(local_path)
+        return 0
+    try:
+        with open(journal_path) as journal:
+            entry = json.load(journal)
+    except (OSError, ValueError):
+        entry = {}
+    if entry.get('name') != file_name or entry.get('size') != remote_size:
+        _discard_part(local_path)
+        return 0
+    # Hanya byte yang sudah tercatat di journal yang dipercaya
+    offset = min(entry.get('offset', 0), os.path.getsize(part_path))
+    if remote_size is not None and offset > remote_size:
+        _discard_part(local_path)
+        return 0
+    with open(part_path, 'r+b') as part:
+        part.truncate(offset)
+    return offset
+
+# Pindahkan .part ke nama akhir secara atomik setelah unduhan lengkap
+def commit_download(local_path):
+    part_path, journal_path = part_paths(local_path)
+    os.replace(part_path, local_path)
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+
+# Cek apakah server menolak REST (tidak mendukung resume)
+def _rest_unsupported(e):
+    return isinstance(e, ftplib.error_perm) and str(e)[:3] in ('500', '501', '502', '504')
+
+# Pesan ruang disk untuk sisa file agar tidak terfragmentasi; diabaikan jika
+# sistem file atau platform tidak mendukung
+def preallocate(fd, offset, remote_size):
+    if not remote_size or remote_size <= offset or not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(fd, offset, remote_size - offset)
+    except OSError:
+        pass
+
+# Baca koneksi data ke satu buffer yang dipakai ulang (tanpa alokasi per blok)
+def _read_into(conn, write, blocksize):
+    buffer = bytearray(blocksize)
+    view = memoryview(buffer)
+    while True:
+        received = conn.recv_into(buffer)
+        if not received:
+            break
+        write(view[:received])
+
+# Salin socket ke file lewat pipe dengan splice (Linux), data tidak melewati
+# ruang Python. Socket ftplib ber-timeout bersifat non-blocking, jadi tunggu
+# dengan select sebelum membaca.
+def _splice_into(conn, fd, advance, blocksize):
+    read_end, write_end = os.pipe()
+    try:
+        while True:
+            try:
+                received = os.splice(conn.fileno(), write_end, blocksize)
+            except BlockingIOError:
+                if not select.select([conn], [], [], conn.gettimeout())[0]:
+                    raise socket.timeout(f"Tidak ada data selama {conn.gettimeout()} detik")
+                continue
+            if not received:
+                break
+            pending = received
+            while pending:
+                pending -= os.splice(read_end, fd, pending)
+            advance(received)
+    finally:
+        os.close(read_end)
+        os.close(write_end)
+
+# Unduh file ke `.part` dengan journal offset, lanjutkan dengan REST bila ada
+# sisa unduhan sebelumnya, lalu rename ke `local_path` saat lengkap.
+# `wrap` opsional membungkus callback write (misalnya pembatas laju).
+# `size` dari snapshot MLSD menghemat perintah SIZE dan dipakai untuk
+# pra-alokasi. `checksum` (StreamChecksum) dihitung dari data yang diterima.
+# FTP_SPLICE=1 memakai splice di Linux jika tidak ada `wrap` maupun `checksum`.
+def download_file(ftp, file_name, local_path, wrap=None, size=None, blocksize=None, checksum=None):
+    part_path, journal_path = part_paths(local_path)
+    blocksize = blocksize or int(os.getenv('FTP_BLOCKSIZE', DEFAULT_BLOCKSIZE))
+    ftp.voidcmd('TYPE I')
+    remote_size = size
+    if remote_size is None:
+        try:
+            remote_size = ftp.size(file_name)
+        except ftplib.error_perm:
+            remote_size = None
+
+    offset = resume_offset(local_path, file_name, remote_size)
+    if offset:
+        logging.info(f"Melanjutkan unduhan {file_name} dari byte {offset}.")
+
+    # File mentah tanpa buffer Python; posisi tulis diatur sendiri karena
+    # pra-alokasi sudah memperpanjang file
+    fd = os.open(part_path, os.O_WRONLY | os.O_CREAT, 0o644)
+    with open(fd, 'wb', buffering=0) as part:
+        part.seek(offset)
+        if offset and checksum is not None:
+            # Bagian yang sudah ada ikut dihitung agar checksum mencakup seluruh file
+            checksum.update_from_file(part_path, offset)
+        preallocate(fd, offset, remote_size)
+        _write_journal(journal_path, file_name, remote_size, offset)
+        progress = {'received': offset, 'committed': offset}
+
+        def advance(count):
+            progress['received'] += count
+            if progress['received'] - progress['committed'] >= JOURNAL_INTERVAL:
+                os.fsync(fd)
+                _write_journal(journal_path, file_name, remote_size, progress['received'])
+                progress['committed'] = progress['received']
+
+        def write(data):
+            view = memoryview(data)
+            if checksum is not None:
+                checksum.update(data)
+            while view:
+                view = view[part.write(view):]
+            advance(len(data))
+
+        callback = wrap(write) if wrap else write
+        splice = callback is write and checksum is None and os.getenv('FTP_SPLICE', '0') == '1' and hasattr(os, 'splice')
+
+        def retrieve(rest):
+            with ftp.transfercmd(f'RETR {file_name}', rest) as conn:
+                if splice:
+                    _splice_into(conn, fd, advance, blocksize)
+                else:
+                    _read_into(conn, callback, blocksize)
+            ftp.voidresp()
+
+        try:
+            retrieve(offset or None)
+        except Exception as e:
+            if not (offset and _rest_unsupported(e)):
+                raise
+            # Server tidak mendukung REST; ulang dari awal
+            logging.warning(f"Server menolak REST untuk {file_name}. Mengunduh ulang dari awal.")
+            part.seek(0)
+            part.truncate()
+            preallocate(fd, 0, remote_size)
+            if checksum is not None:
+                checksum.reset()
+            progress['received'] = progress['committed'] = 0
+            retrieve(None)
+        finally:
+            # Catat posisi terakhir agar putus koneksi bisa dilanjutkan
+            _write_journal(journal_path, file_name, remote_size, progress['received'])
+
+    if remote_size is not None and progress['received'] != remote_size:
+        # Dianggap putus koneksi: worker membuat sesi baru lalu melanjutkan dari offset
+        raise EOFError(f"Unduhan {file_name} tidak lengkap ({progress['received']}/{remote_size} byte)")
+    commit_download(local_path)
+    return progress['received']
+
+# Unduh file langsung ke objek file `out` (misalnya buffer untuk mode arsip
+# segmen) tanpa file .part; tidak bisa dilanjutkan, jadi hanya untuk file kecil.
+# Mengembalikan jumlah byte yang diterima.
+def download_stream(ftp, file_name, out, wrap=None, size=None, blocksize=None, checksum=None):
+    blocksize = blocksize or int(os.getenv('FTP_BLOCKSIZE', DEFAULT_BLOCKSIZE))
+    ftp.voidcmd('TYPE I')
+    progress = {'received': 0}
+
+    def write(data):
+        if checksum is not None:
+            checksum.update(data)
+        out.write(data)
+        progress['received'] += len(data)
+
+    with ftp.transfercmd(f'RETR {file_name}') as conn:
+        _read_into(conn, wrap(write) if wrap else write, blocksize)
+    ftp.voidresp()
+    if size is not None and progress['received'] != size:
+        raise EOFError(f"Unduhan {file_name} tidak lengkap ({progress['received']}/{size} byte)")
+    return progress['received']
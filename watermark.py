@@ -0,0 +1,132 @@
+import logging
+import os
+import threading
+from datetime import timedelta
+from bson import json_util
+
+# Baca file JSON kecil (format json_util agar datetime/ObjectId utuh), None jika belum ada
+def load_json(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as source:
+            return json_util.loads(source.read())
+    except (OSError, ValueError) as e:
+        logging.warning(f"{path} tidak bisa dibaca, mulai dari awal: {e}")
+        return None
+
+# Simpan secara atomik (tulis ke file sementara lalu rename) sehingga crash
+# tidak pernah meninggalkan file rusak
+def save_json(path, value):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as target:
+        target.write(json_util.dumps(value))
+        target.flush()
+        os.fsync(target.fileno())
+    os.replace(temp_path, path)
+
+# High-water mark untuk mode inkremental: createdAt (dan _id) dokumen terakhir
+# yang sudah tuntas, disimpan ke file JSON kecil bersama jumlah percobaan
+# dokumen yang gagal ({'_id', 'createdAt', 'attempts'}).
+class Watermark:
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._lock = threading.Lock()
+        self._value = load_json(self.path)
+
+    # createdAt terakhir yang sudah tuntas, atau None jika belum pernah disimpan
+    def get(self):
+        with self._lock:
+            return self._value['createdAt'] if self._value else None
+
+    def failures(self):
+        with self._lock:
+            return list(self._value.get('failures', [])) if self._value else []
+
+    # _id dokumen yang sudah gagal `max_attempts` kali; dikeluarkan dari query berikutnya
+    def excluded(self, max_attempts):
+        if not max_attempts:
+            return []
+        return [failure['_id'] for failure in self.failures() if failure['attempts'] >= max_attempts]
+
+    def save(self, created_at, document_id=None, failures=()):
+        with self._lock:
+            value = {'createdAt': created_at, '_id': document_id, 'failures': list(failures)}
+            save_json(self.path, value)
+            self._value = value
+
+# Pelacak satu run inkremental: mencatat createdAt tertinggi yang sudah dibaca
+# dan dokumen yang belum selesai, lalu menentukan watermark berikutnya.
+# Watermark tidak melewati dokumen yang gagal sehingga dokumen itu diambil lagi
+# pada run berikutnya, kecuali sudah gagal `max_attempts` kali: dokumen itu
+# tidak lagi menahan watermark dan dikeluarkan dari query (tetap process != true
+# untuk move_all.py), agar batch berikutnya tidak terus berisi dokumen yang sama.
+class WatermarkTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = None
+        self._outstanding = {}
+
+    # Catat dokumen yang dibaca dari cursor (termasuk yang nantinya dilewati)
+    def seen(self, documents):
+        for document in documents:
+            created_at = document.get('createdAt')
+            if created_at is not None:
+                with self._lock:
+                    if self._latest is None or created_at >= self._latest[0]:
+                        self._latest = (created_at, document['_id'])
+            yield document
+
+    # Catat dokumen yang benar-benar dikirim ke worker
+    def started(self, documents):
+        for document in documents:
+            if document.get('createdAt') is not None:
+                with self._lock:
+                    self._outstanding[document['_id']] = document['createdAt']
+            yield document
+
+    # Dokumen yang dilewati karena file-nya tidak ada di snapshot FTP dihitung
+    # seperti dokumen gagal: menahan watermark sampai batas percobaan tercapai
+    def skipped(self, document):
+        if document.get('createdAt') is not None:
+            with self._lock:
+                self._outstanding[document['_id']] = document['createdAt']
+
+    def finished(self, document):
+        with self._lock:
+            self._outstanding.pop(document['_id'], None)
+
+    # (createdAt, _id, failures) untuk watermark berikutnya, atau None jika tidak
+    # berubah. `failures` dari Watermark.failures(); `lookback` (detik) membuang
+    # dokumen yang dikeluarkan tetapi sudah di luar jendela query.
+    def next_mark(self, failures=(), max_attempts=0, lookback=0):
+        previous = {failure['_id']: failure for failure in failures}
+        with self._lock:
+            current = [
+                {'_id': document_id, 'createdAt': created_at,
+                 'attempts': previous.get(document_id, {}).get('attempts', 0) + 1}
+                for document_id, created_at in self._outstanding.items()
+            ]
+            latest = self._latest
+        pinned = [failure for failure in current if not max_attempts or failure['attempts'] < max_attempts]
+        for failure in current:
+            if max_attempts and failure['attempts'] == max_attempts:
+                logging.warning(
+                    f"Dokumen {failure['_id']} gagal {max_attempts} kali; tidak lagi menahan watermark "
+                    "dan dilewati pada run inkremental berikutnya."
+                )
+        if pinned:
+            first = min(pinned, key=lambda failure: failure['createdAt'])
+            mark = (first['createdAt'], first['_id'])
+        elif latest is not None:
+            mark = latest
+        else:
+            return None
+        window = mark[0] - timedelta(seconds=lookback)
+        seen = {failure['_id'] for failure in current}
+        carried = [
+            failure for failure in failures
+            if failure['_id'] not in seen and max_attempts and failure['attempts'] >= max_attempts
+            and failure['createdAt'] >= window
+        ]
+        return mark[0], mark[1], current + carried